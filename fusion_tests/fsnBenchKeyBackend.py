@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+"""
+ Shows which secp256k1 backend the bundled eth_account selected, and times signing and recovering
+ transactions with each backend that is installed. Run with --require-fast in a deployment image to
+ fail (exit status 1) unless the fast coincurve backend is in use.
+"""
+#
+#
+import sys
+import time
+
+from web3fsnpy.eth_account import (
+    Account,
+)
+from web3fsnpy.eth_account.account import (
+    KEY_BACKENDS,
+)
+
+
+nTx = 300
+FAST_BACKEND = 'CoinCurveECCBackend'
+
+
+def bench(account):
+    key = b'\x02' * 32
+    Tx = {'nonce': 0, 'gasPrice': 10**9, 'gas': 21000, 'to': '0x' + '11'*20, 'value': 1, 'data': b'', 'chainId': 32659}
+    t0 = time.perf_counter()
+    for ii in range(nTx):
+        Tx['nonce'] = ii
+        rawTx = account.sign_transaction(Tx, key).rawTransaction
+    t1 = time.perf_counter()
+    for ii in range(nTx):
+        sender = account.recover_transaction(rawTx)
+    t2 = time.perf_counter()
+    assert sender == Account.from_key(key).address
+    return nTx/(t1 - t0), nTx/(t2 - t1)
+
+
+active = type(Account.key_backend()).__name__
+print('Active backend: {}\n'.format(active))
+
+print('{:24s} {:>12s} {:>12s}'.format('backend', 'sign/s', 'recover/s'))
+for backend in KEY_BACKENDS:
+    account = Account()
+    try:
+        account.set_key_backend(backend)
+    except Exception as e:
+        print('{:24s} not available ({})'.format(backend.split('.')[-1], e.__class__.__name__))
+        continue
+    signRate, recoverRate = bench(account)
+    print('{:24s} {:12.0f} {:12.0f}'.format(backend.split('.')[-1], signRate, recoverRate))
+
+if '--require-fast' in sys.argv and active != FAST_BACKEND:
+    print('\nThe fast backend is not in use, install coincurve')
+    sys.exit(1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+"""
+ Memory used by allTickets, getTimeLockBalance and getAllSwaps results on a mainnet sized fixture,
+ as the AttributeDicts returned by web3 and as the compact records (records=True)
+"""
+#
+#
+import gc
+import json
+import random
+import tracemalloc
+
+from web3.datastructures import (
+    AttributeDict,
+)
+
+from web3fsnpy.fusion.fsn_api import (
+    LazySwap,
+)
+from web3fsnpy.fusion.fsn_records import (
+    Swap,
+    timeLockRecord,
+    ticketTable,
+)
+from web3fsnpy.fusion.fsn_utils import (
+    TIME_FOREVER,
+)
+
+
+nTickets = 60000
+nOwners = 600
+nItems = 50000
+nSwaps = 20000
+
+
+def recursive(value):
+    #
+    # As web3's attrdict middleware formats the node's results
+    #
+    if isinstance(value, dict):
+        return AttributeDict({key: recursive(v) for key, v in value.items()})
+    if isinstance(value, list):
+        return [recursive(v) for v in value]
+    return value
+
+
+def randomHex(nbytes):
+    return '0x' + random.getrandbits(8*nbytes).to_bytes(nbytes, 'big').hex()
+
+
+def makeTickets():
+    owners = [randomHex(20) for ii in range(nOwners)]
+    tickets = {}
+    for ii in range(nTickets):
+        height = random.randrange(1, 3000000)
+        start = 1561000000 + height*13
+        tickets[randomHex(32)] = {
+            'Owner': random.choice(owners), 'Height': height, 'StartTime': start, 'ExpireTime': start + 2592000,
+        }
+    return json.dumps(tickets)
+
+
+def makeTimeLock():
+    items = []
+    t = 1561000000
+    for ii in range(nItems):
+        t += random.randrange(1, 86400)
+        end = TIME_FOREVER if ii % 10 == 0 else t + random.randrange(86400, 86400*365)
+        items.append({'StartTime': t, 'EndTime': end, 'Value': random.randrange(1, 10**22)})
+    return json.dumps({'Items': items})
+
+
+def makeSwaps():
+    assets = [randomHex(32) for ii in range(50)]
+    makers = [randomHex(20) for ii in range(2000)]
+    rows = []
+    for ii in range(nSwaps):
+        data = {
+            'Description': '', 'FromStartTime': 0, 'ToEndTime': TIME_FOREVER, 'MinFromAmount': [str(10**18)],
+            'MinToAmount': [str(10**20)], 'SwapSize': random.randrange(1, 1000), 'Targes': [],
+            'Time': 1561000000 + ii, 'ToAssetID': [random.choice(assets)],
+        }
+        rows.append({
+            'swapID': randomHex(32), 'timeStamp': 1561000000 + ii, 'fromAddress': random.choice(makers),
+            'fromAsset': random.choice(assets), 'toAsset': random.choice(assets), 'recCreated': '2019-07-01T00:00:00.000Z',
+            'height': 1000000 + ii, 'hash': randomHex(32), 'size': 1, 'data': json.dumps(data),
+        })
+    return json.dumps(rows)
+
+
+def measure(build):
+    #
+    # Bytes still allocated by the result of build()
+    #
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+random.seed(1)
+fixtures = [
+    ('allTickets ({} tickets)'.format(nTickets), makeTickets(), ticketTable,
+        lambda table: table.toDict()),
+    ('getTimeLockBalance ({} items)'.format(nItems), makeTimeLock(), timeLockRecord,
+        lambda record: record.toDict()),
+    ('getAllSwaps ({} swaps)'.format(nSwaps), makeSwaps(), lambda rows: [Swap.fromRow(row) for row in rows],
+        lambda swaps: [swap.toDict() for swap in swaps]),
+]
+
+print('{:34s} {:>12s} {:>12s} {:>8s}'.format('', 'AttributeDict', 'records', 'saving'))
+for name, text, toRecords, toDicts in fixtures:
+    if name.startswith('getAllSwaps'):
+        dicts, before = measure(lambda: [recursive(dict(LazySwap(row))) for row in json.loads(text)])
+    else:
+        dicts, before = measure(lambda: recursive(json.loads(text)))
+    #
+    # The records are made from the parsed JSON, which is then dropped as it would be after the call
+    #
+    records, after = measure(lambda: toRecords(json.loads(text)))
+    print('{:34s} {:10.1f} MB {:10.1f} MB {:7.0f}%'.format(name, before/1e6, after/1e6, 100*(1 - after/before)))
+    if name.startswith('getAllSwaps'):
+        assert toDicts(records) == [dict(swap) for swap in dicts]
+    else:
+        assert toDicts(records) == json.loads(text)
+    del dicts, records
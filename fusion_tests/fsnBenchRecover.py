@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+#
+"""
+ Throughput of recovering the senders of signed transactions and messages, one at a time with
+ recover_transaction and recover_message, and in batches with recover_transactions and recover_messages
+"""
+#
+#
+import os
+import sys
+import time
+
+from web3fsnpy.eth_account import (
+    Account,
+)
+from web3fsnpy.eth_account.messages import (
+    encode_defunct,
+)
+
+
+nTx = 2000
+nAccounts = 20
+workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+
+
+accounts = [Account.create() for ii in range(nAccounts)]
+transactions = []
+messages = []
+senders = []
+for ii in range(nTx):
+    acct = accounts[ii % nAccounts]
+    Tx = {'nonce': ii, 'gasPrice': 10**9, 'gas': 21000, 'to': accounts[(ii + 1) % nAccounts].address,
+          'value': ii, 'data': b'', 'chainId': 32659}
+    transactions.append(acct.sign_transaction(Tx).rawTransaction)
+    message = encode_defunct(text='audit {}'.format(ii))
+    messages.append((message, acct.sign_message(message).signature))
+    senders.append(acct.address)
+
+print('{} transactions and {} messages, key backend {}, {} CPUs\n'.format(
+    nTx, nTx, type(Account.key_backend()).__name__, os.cpu_count()))
+
+
+def timed(name, run, base=None):
+    t0 = time.perf_counter()
+    addresses = list(run())
+    elapsed = time.perf_counter() - t0
+    assert addresses == senders
+    print('{:40s} {:8.0f} per second{}'.format(name, nTx/elapsed, '' if base is None else '  x{:.1f}'.format(base/elapsed)))
+    return elapsed
+
+
+base = timed('recover_transaction, one at a time', lambda: (Account.recover_transaction(Tx) for Tx in transactions))
+timed('recover_transactions, 1 worker', lambda: Account.recover_transactions(transactions, workers=1), base)
+timed('recover_transactions, {} workers'.format(workers), lambda: Account.recover_transactions(transactions, workers=workers), base)
+print()
+base = timed('recover_message, one at a time', lambda: (Account.recover_message(m, signature=s) for m, s in messages))
+timed('recover_messages, 1 worker', lambda: Account.recover_messages(messages, workers=1), base)
+timed('recover_messages, {} workers'.format(workers), lambda: Account.recover_messages(messages, workers=workers), base)
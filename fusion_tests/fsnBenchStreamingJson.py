@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+#
+"""
+ Benchmark peak memory and time to first record when reading a large fsnapi page,
+ comparing the streaming decoder against reading the whole body and calling json.loads
+"""
+#
+#
+import sys
+import json
+import time
+import resource
+import subprocess
+import threading
+import tracemalloc
+import urllib.request
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+from web3fsnpy.fusion.fsn_api import fsnapi
+
+
+nSwaps = 10000      # The size of a full swaps2/all page
+
+
+def makePage(nRows):
+    rows = []
+    for ii in range(nRows):
+        data = {
+            'Description': '', 'FromAssetID': '0x' + 'f'*64, 'FromStartTime': 0, 'FromEndTime': 18446744073709551615,
+            'MinFromAmount': 29100000000000000000, 'ToAssetID': '0x' + 'f'*64, 'ToStartTime': 1577836800,
+            'ToEndTime': 18446744073709551615, 'MinToAmount': 2500000000000000000000, 'SwapSize': 10,
+            'Targes': [], 'Time': 1574278159,
+        }
+        rows.append({
+            'swapID': '0x{:064x}'.format(ii), 'timeStamp': 1574278172, 'fromAddress': '0x{:040x}'.format(ii),
+            'fromAsset': '0x' + 'f'*64, 'toAsset': '0x' + 'f'*64, 'recCreated': '2019-11-20T19:29:53.000Z',
+            'height': 947735 + ii, 'hash': '0x{:064x}'.format(ii), 'size': 10, 'data': json.dumps(data),
+        })
+    return json.dumps(rows).encode('utf-8')
+
+
+class PageHandler(BaseHTTPRequestHandler):
+
+    page = None
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.page)))
+        self.end_headers()
+        # Write in pieces so that the client sees the body arrive over time
+        for ii in range(0, len(self.page), 65536):
+            self.wfile.write(self.page[ii:ii+65536])
+
+    def log_message(self, *args):
+        pass
+
+
+def readPage(api, mode, url):
+    t0 = time.perf_counter()
+    tFirst = None
+    if mode == 'json.loads':
+        response = urllib.request.urlopen(url)
+        rows = json.loads(response.read().decode('utf-8'))
+        tFirst = time.perf_counter() - t0
+    elif mode == 'stream list':
+        rows = []
+        for row in api.streamJsonArray(url):
+            if tFirst is None:
+                tFirst = time.perf_counter() - t0
+            rows.append(row)
+    else:
+        rows = 0
+        for row in api.streamJsonArray(url):
+            if tFirst is None:
+                tFirst = time.perf_counter() - t0
+            rows += 1
+    return tFirst, time.perf_counter() - t0
+
+
+def runOne(mode, url):
+    #
+    # Runs in a fresh process, timing one pass and measuring the peak of traced allocations in a second
+    #
+    api = fsnapi(None, 'testnet')
+    tFirst, tTotal = readPage(api, mode, url)
+    rssBefore = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    readPage(api, mode, url)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rssPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'mode': mode, 'first': tFirst, 'total': tTotal, 'peak': peak, 'rss_kb': rssPeak - rssBefore}))
+
+
+if len(sys.argv) == 3:
+    runOne(sys.argv[1], sys.argv[2])
+    sys.exit(0)
+
+
+PageHandler.page = makePage(nSwaps)
+server = HTTPServer(('127.0.0.1', 0), PageHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+url = 'http://127.0.0.1:{}/swaps2/all'.format(server.server_port)
+
+print('Page of {} swaps, {:.1f} MB'.format(nSwaps, len(PageHandler.page)/1e6))
+print('\'stream list\' keeps every row like fsnapi_swaps does, \'stream\' handles each row and drops it\n')
+
+for mode in ['json.loads', 'stream list', 'stream']:
+    out = subprocess.run([sys.executable, __file__, mode, url], stdout=subprocess.PIPE, check=True)
+    result = json.loads(out.stdout.decode('utf-8'))
+    print('{:12s} time to first record {:8.1f} ms  total {:8.1f} ms  peak traced memory {:7.1f} MB  RSS growth {:7.1f} MB'.format(
+        result['mode'], result['first']*1000, result['total']*1000, result['peak']/1e6, result['rss_kb']/1024))
+
+server.shutdown()
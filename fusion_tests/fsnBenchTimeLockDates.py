@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+#
+"""
+ Benchmark converting the StartTime and EndTime of many time lock items to dates, comparing
+ the old per item path (parsing the epoch with strptime on every call) with the bulk conversions
+"""
+#
+#
+import time
+import random
+from datetime import datetime, timedelta
+
+
+from web3fsnpy.fusion.fsn_utils import (
+    TIME_FOREVER,
+)
+from web3fsnpy.fusion.fsn_timelocks import (
+    np,
+    numToDatetime,
+    numsToDatetimes,
+    timeLockItemsToDatetimes,
+)
+
+
+nItems = 200000
+
+
+def oldNumToDatetime(tdelta):
+    #
+    # numToDatetime as it was, for comparison
+    #
+    tzero = datetime.strptime('1970-01-01T00:00:00+0000', '%Y-%m-%dT%H:%M:%S%z')
+    return tzero + timedelta(seconds = tdelta)
+
+
+def perItem(convert, items):
+    starts = []
+    ends = []
+    for item in items:
+        starts.append(convert(item['StartTime']))
+        ends.append('infinity' if item['EndTime'] >= TIME_FOREVER else convert(item['EndTime']))
+    return starts, ends
+
+
+random.seed(1)
+items = []
+for ii in range(nItems):
+    start = random.randrange(1560000000, 1700000000)
+    end = TIME_FOREVER if ii % 4 == 0 else start + random.randrange(86400, 86400*365)
+    items.append({'StartTime': start, 'EndTime': end, 'Value': 10**18})
+
+print('{} time lock items, {} timestamps, a quarter of the EndTimes are forever\n'.format(nItems, 2*nItems))
+
+runs = [
+    ('per item, strptime epoch', lambda: perItem(oldNumToDatetime, items)),
+    ('per item, numToDatetime',  lambda: perItem(numToDatetime, items)),
+    ('bulk, datetimes',          lambda: timeLockItemsToDatetimes(items, numpy=False)),
+]
+if np is not None:
+    runs.append(('bulk, datetime64',     lambda: timeLockItemsToDatetimes(items, numpy=True)))
+else:
+    print('numpy is not installed, skipping datetime64\n')
+
+base = None
+for name, run in runs:
+    best = None
+    for repeat in range(3):
+        t0 = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    base = base or best
+    print('{:28s} {:8.1f} ms  {:8.0f} ns per timestamp  x{:.1f}'.format(name, best*1000, best*1e9/(2*nItems), base/best))
+
+starts, ends = timeLockItemsToDatetimes(items[:4], numpy=False)
+assert starts == perItem(oldNumToDatetime, items[:4])[0]
+assert ends == perItem(oldNumToDatetime, items[:4])[1]
+assert numsToDatetimes([hex(items[1]['StartTime'])]) == [starts[1]]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+"""
+ Checks of the time lock step function arithmetic in LockSegments: segments split where two time locks
+ overlap, neighbours with the same value are joined again, and a move that is not covered is refused
+ with the missing parts. Runs offline, no node needed
+"""
+#
+#
+
+
+from web3fsnpy.fusion.fsn_utils import (
+    TIME_FOREVER,
+)
+from web3fsnpy.fusion.fsn_lockmath import (
+    LockSegments,
+)
+from web3fsnpy.fusion.exceptions import (
+    TimeLockShortfall,
+)
+
+
+def item(value, startTime, endTime=TIME_FOREVER):
+    return {'StartTime': startTime, 'EndTime': endTime, 'Value': value}
+
+
+#
+# Split: two overlapping locks give three segments
+#
+a = LockSegments([item(10, 100, 199)])
+b = LockSegments([item(5, 150, 299)])
+total = a.add(b)
+assert total.items() == [item(10, 100, 149), item(15, 150, 199), item(5, 200, 299)], total
+assert total.lockedAt(99) == 0
+assert total.lockedAt(175) == 15
+assert total.availableOver(100, 299) == 5
+assert total.availableOver(150, 199) == 15
+assert total.covers(10, 100, 199)
+assert not total.covers(10, 100, 200)
+
+#
+# Merge: adjacent items with the same value come out as one item, and taking back what was added
+# leaves the original segments
+#
+joined = LockSegments([item(7, 100, 199), item(7, 200, 299)])
+assert joined.items() == [item(7, 100, 299)], joined
+assert joined == LockSegments.single(7, 100, 299)
+assert total.sub(b) == a
+assert a.sub(a).isEmpty()
+forever = LockSegments.single(3, 500)
+assert forever.items() == [item(3, 500)], forever
+
+#
+# Hex strings, as the node returns them, read the same as integers
+#
+assert LockSegments([{'StartTime': '0x64', 'EndTime': '0xc7', 'Value': '0xa'}]) == a
+
+#
+# Shortfall: sub refuses a move that is not covered and lists what is missing
+#
+gaps = a.shortfall(LockSegments.single(12, 150, 249))
+assert gaps == [(150, 199, 2), (200, 249, 12)], gaps
+try:
+    a.sub(LockSegments.single(12, 150, 249))
+except TimeLockShortfall as e:
+    assert e.gaps == gaps, e.gaps
+else:
+    raise AssertionError('sub did not raise TimeLockShortfall')
+assert a.shortfall(LockSegments.single(10, 120, 180)) == []
+
+#
+# Clip: what is locked before now is dropped, as the node drops expired items
+#
+assert total.clip(160).items() == [item(15, 160, 199), item(5, 200, 299)]
+assert total.clip(400).isEmpty()
+assert LockSegments([item(10, 100, 199), item(5, 50, 120)], now=150) == LockSegments.single(10, 150, 199)
+
+try:
+    total.availableOver(200, 100)
+except ValueError:
+    pass
+else:
+    raise AssertionError('availableOver accepted an endTime before startTime')
+
+print('LockSegments checks passed')
@@ -1,3 +1,3 @@
-from eth_account.account import (  # noqa: F401
+from .account import (  # noqa: F401
     Account,
 )
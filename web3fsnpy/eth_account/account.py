@@ -1,6 +1,15 @@
+from collections import (
+    deque,
+)
 from collections.abc import (
     Mapping,
 )
+from concurrent.futures import (
+    ProcessPoolExecutor,
+)
+from itertools import (
+    islice,
+)
 import json
 import os
 import warnings
@@ -32,28 +41,77 @@ from hexbytes import (
     HexBytes,
 )
 
-from eth_account._utils.signing import (
+from ._utils.signing import (
     hash_of_signed_transaction,
     sign_message_hash,
     sign_transaction_dict,
     to_standard_signature_bytes,
     to_standard_v,
 )
-from eth_account._utils.transactions import (
+from ._utils.transactions import (
     Transaction,
     vrs_from,
 )
-from eth_account.datastructures import (
+from .datastructures import (
     AttributeDict,
 )
-from eth_account.messages import (
+from .messages import (
     SignableMessage,
     _hash_eip191_message,
 )
-from eth_account.signers.local import (
+from .signers.local import (
     LocalAccount,
 )
 
+# Backends tried by the default Account, fastest first
+KEY_BACKENDS = (
+    'eth_keys.backends.CoinCurveECCBackend',
+    'eth_keys.backends.NativeECCBackend',
+)
+
+
+def _probe_key_backend(key_api):
+    # Sign and recover once, so that a backend whose library is installed but broken is skipped
+    private_key = key_api.PrivateKey(b'\x01' * 32, backend=key_api.backend)
+    msg_hash = keccak(b'eth_account key backend probe')
+    signature = private_key.sign_msg_hash(msg_hash)
+    if signature.recover_public_key_from_msg_hash(msg_hash) != private_key.public_key:
+        raise ValueError("The key backend recovered the wrong public key")
+
+
+def select_key_backend():
+    """
+    Get an :class:`eth_keys.KeyAPI` with the fastest of :data:`KEY_BACKENDS` that works here.
+    As in eth_keys, the ``ECC_BACKEND_CLASS`` environment variable overrides the choice.
+
+    :returns: the key API
+    :rtype: eth_keys.KeyAPI
+    """
+    backend = os.getenv('ECC_BACKEND_CLASS')
+    if backend:
+        return KeyAPI(backend)
+    for backend in KEY_BACKENDS:
+        try:
+            key_api = KeyAPI(backend)
+            _probe_key_backend(key_api)
+        except Exception:
+            continue
+        return key_api
+    return keys
+
+
+class _DefaultKeyAPI(object):
+    """
+    The default ``Account._keys``, which selects its backend the first time it is used,
+    rather than when eth_keys is imported.
+    """
+    key_api = None
+
+    def __get__(self, instance, owner):
+        if self.key_api is None:
+            self.key_api = select_key_backend()
+        return self.key_api
+
 
 class Account(object):
     """
@@ -61,7 +119,7 @@ class Account(object):
 
     It does **not** require a connection to an Ethereum node.
     """
-    _keys = keys
+    _keys = _DefaultKeyAPI()
 
     _default_kdf = os.getenv('ETH_ACCOUNT_KDF', 'scrypt')
 
@@ -326,11 +384,14 @@ class Account(object):
         if vrs is not None:
             v, r, s = map(hexstr_if_str(to_int), vrs)
             v_standard = to_standard_v(v)
-            signature_obj = self._keys.Signature(vrs=(v_standard, r, s))
+            signature_obj = self._keys.Signature(vrs=(v_standard, r, s), backend=self._keys.backend)
         elif signature is not None:
             signature_bytes = HexBytes(signature)
             signature_bytes_standard = to_standard_signature_bytes(signature_bytes)
-            signature_obj = self._keys.Signature(signature_bytes=signature_bytes_standard)
+            signature_obj = self._keys.Signature(
+                signature_bytes=signature_bytes_standard,
+                backend=self._keys.backend,
+            )
         else:
             raise TypeError("You must supply the vrs tuple or the signature bytes")
         pubkey = signature_obj.recover_public_key_from_msg_hash(hash_bytes)
@@ -369,6 +430,62 @@ class Account(object):
         msg_hash = hash_of_signed_transaction(txn)
         return self._recover_hash(msg_hash, vrs=vrs_from(txn))
 
+    @combomethod
+    def recover_transactions(self, serialized_transactions, workers=None, chunksize=256,
+                             ignore_errors=False):
+        """
+        Get the addresses of the accounts that signed many transactions, as
+        :meth:`~eth_account.account.Account.recover_transaction` does for one.
+
+        The transactions are read from the iterable in chunks of ``chunksize``, and each
+        chunk is decoded and recovered in a pool of ``workers`` processes, using the same
+        key backend as this Account. Addresses are yielded in the order of the
+        transactions, as soon as their chunk is done, so the iterable can be larger than memory.
+
+        :param serialized_transactions: complete signed transactions
+        :type serialized_transactions: iterable of hex str, bytes or int
+        :param int workers: number of processes, the number of CPUs by default.
+            With 1, everything runs in this process
+        :param int chunksize: number of transactions sent to a process at once
+        :param bool ignore_errors: yield None for a transaction that cannot be
+            decoded or recovered, instead of raising
+        :returns: addresses of signers, hex-encoded & checksummed
+        :rtype: iterator of str
+
+        .. code-block:: python
+
+            >>> for address in Account.recover_transactions(raw_transactions, workers=4):
+            ...     audit(address)
+        """
+        return _recover_batch(
+            self, 'transaction', serialized_transactions, workers, chunksize, ignore_errors
+        )
+
+    @combomethod
+    def recover_messages(self, signed_messages, workers=None, chunksize=256, ignore_errors=False):
+        """
+        Get the addresses of the accounts that signed many messages, as
+        :meth:`~eth_account.account.Account.recover_message` does for one.
+        Chunks are recovered in a pool of processes, and the addresses yielded
+        in order, as for :meth:`~eth_account.account.Account.recover_transactions`.
+
+        :param signed_messages: pairs of (signable_message, signature), where the
+            signature is bytes, hex str or int as r+s+v, or a (v, r, s) tuple
+        :type signed_messages: iterable of tuple
+        :param int workers: number of processes, the number of CPUs by default
+        :param int chunksize: number of messages sent to a process at once
+        :param bool ignore_errors: yield None for a message that cannot be recovered, instead of raising
+        :returns: addresses of signers, hex-encoded & checksummed
+        :rtype: iterator of str
+
+        .. code-block:: python
+
+            >>> from eth_account.messages import encode_defunct
+            >>> pairs = ((encode_defunct(text=text), signature) for text, signature in rows)
+            >>> addresses = list(Account.recover_messages(pairs))
+        """
+        return _recover_batch(self, 'message', signed_messages, workers, chunksize, ignore_errors)
+
     def setKeyBackend(self, backend):
         """
         .. CAUTION:: Deprecated for :meth:`~eth_account.account.Account.set_key_backend`.
@@ -392,6 +509,22 @@ class Account(object):
         """
         self._keys = KeyAPI(backend)
 
+    @combomethod
+    def key_backend(self):
+        """
+        Get the backend used by the underlying eth-keys library, to check that the fast
+        one is in use.
+
+        :returns: the backend
+        :rtype: eth_keys.backends.base.BaseECCBackend
+
+        .. code-block:: python
+
+            >>> Account.key_backend()
+            <eth_keys.backends.coincurve.CoinCurveECCBackend object at 0x7f0a2c3b1e10>
+        """
+        return self._keys.backend
+
     @combomethod
     def sign_message(self, signable_message: SignableMessage, private_key):
         r"""
@@ -580,9 +713,88 @@ class Account(object):
             return key
 
         try:
-            return self._keys.PrivateKey(HexBytes(key))
+            # eth_keys datatypes use their own default backend unless they are given one
+            return self._keys.PrivateKey(HexBytes(key), backend=self._keys.backend)
         except ValidationError as original_exception:
             raise ValueError(
                 "The private key must be exactly 32 bytes long, instead of "
                 "%d bytes." % len(key)
             ) from original_exception
+
+
+_worker_account = None
+
+
+def _init_recover_worker(backend_class):
+    global _worker_account
+    _worker_account = Account()
+    _worker_account.set_key_backend(backend_class)
+
+
+def _recover_one(account, kind, item):
+    if kind == 'transaction':
+        return account.recover_transaction(item)
+    signable_message, signature = item
+    if isinstance(signature, (tuple, list)):
+        return account.recover_message(signable_message, vrs=signature)
+    return account.recover_message(signable_message, signature=signature)
+
+
+def _recover_chunk(kind, items, ignore_errors, account=None):
+    in_worker = account is None
+    if in_worker:
+        account = _worker_account
+    addresses = []
+    for item in items:
+        try:
+            addresses.append(_recover_one(account, kind, item))
+        except Exception as e:
+            if ignore_errors:
+                addresses.append(None)
+            elif in_worker:
+                # Some decoding errors cannot be unpickled, which would break the pool
+                raise ValueError("Could not recover the {} signer: {!r}".format(kind, e)) from None
+            else:
+                raise
+    return addresses
+
+
+def _chunks(iterable, chunksize):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _recover_batch(account, kind, items, workers, chunksize, ignore_errors):
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for chunk in _chunks(items, chunksize):
+            yield from _recover_chunk(kind, chunk, ignore_errors, account)
+        return
+
+    # The backend instance may hold modules, so the workers are given its class
+    backend = account._keys.backend
+    backend_class = None if backend is None else type(backend)
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_recover_worker,
+        initargs=(backend_class,),
+    ) as executor:
+        try:
+            for chunk in _chunks(items, chunksize):
+                pending.append(executor.submit(_recover_chunk, kind, chunk, ignore_errors))
+                # Keep the workers busy, without reading far ahead of the consumer
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -23,12 +23,12 @@ from hexbytes import (
     HexBytes,
 )
 
-from eth_account._utils.structured_data.hashing import (
+from ._utils.structured_data.hashing import (
     hash_domain,
     hash_message as hash_eip712_message,
     load_and_validate_structured_message,
 )
-from eth_account._utils.validation import (
+from ._utils.validation import (
     is_valid_address,
 )
 
@@ -3,7 +3,7 @@ import web3
 
 import sys
 
-from eth_account import (
+from web3fsnpy.eth_account import (
     Account,
 ) 
 
@@ -51,6 +51,7 @@ from eth_keys import (
 )
 
 import json
+import time
 
 from hexbytes import (
     HexBytes,
@@ -109,6 +110,7 @@ from web3fsnpy.fusion.exceptions import (
     _notConnected,
     BadSendingAddress,
     PrivateKeyNotSet,
+    FsnApiError,
 )
 
 from web3fsnpy.fusion.fsn_transactions import (
@@ -149,16 +151,88 @@ from web3fsnpy.fusion.fsn_utils import (
     block_number_formatter,
     to_boolean,
     hex2a,
+    TIME_FOREVER,
 )
 
 from web3fsnpy.fusion.fsn_timelocks import (
+    to_hex_if_datestring,
+    referenceTime,
     numToDatetime,
+    numsToDatetimes,
+    numsToDatetime64,
+    timeLockItemsToDatetimes,
     datetimeToHex
 )
 
 
 from web3fsnpy.fusion.fsn_api import (
     fsnapi,
+    LazySwap,
+)
+
+from web3fsnpy.fusion.fsn_columnar import (
+    swapsToColumns,
+    columnsToFrame,
+)
+
+from web3fsnpy.fusion.fsn_crawler import (
+    TransactionCrawler,
+)
+
+from web3fsnpy.fusion.fsn_ingest import (
+    BlockIngester,
+)
+
+from web3fsnpy.fusion.fsn_follower import (
+    BlockFollower,
+)
+
+from web3fsnpy.fusion.fsn_lockmath import (
+    LockSegments,
+    planAssetToTimeLock,
+    planTimeLockToTimeLock,
+    planTimeLockToAsset,
+)
+
+from web3fsnpy.fusion.fsn_keyvault import (
+    KeyVault,
+    DEFAULT_TTL,
+)
+
+from web3fsnpy.fusion.fsn_records import (
+    Swap,
+    timeLockRecord,
+    ticketTable,
+    assetInfo,
+)
+
+from web3fsnpy.fusion.fsn_vesting import (
+    VestingSchedule,
+    VestingDistributor,
+)
+
+from web3fsnpy.fusion.fsn_export import (
+    ROW_GROUP_SIZE,
+    EventExporter,
+    exportSwaps,
+    exportTickets,
+)
+
+from web3fsnpy.fusion.fsn_swapbook import (
+    SwapBook,
+)
+
+from web3fsnpy.fusion.fsn_lockindex import (
+    TimeLockIndex,
+)
+
+from web3fsnpy.fusion.fsn_staking import (
+    StakingAnalytics,
+)
+
+from web3fsnpy.fusion.fsn_ticketlogs import (
+    TicketTracker,
+    TicketEventStream,
 )
 
 from web3 import Web3
@@ -190,7 +264,13 @@ class Fsn(web3.eth.Eth):
     
     acct = None            # This is the Fusion account.
     
+    vault = None           # Keys unlocked from keyfiles, see unlockKeystore
+    
     api = None             # This is Fusion's api
+    
+    _verifiedAssets = None # (cache version, short names) of the last fsnapiVerifiedAssetInfo
+    
+    _stakingAnalytics = None
 
 
     def __init__(self, linkToChain):
@@ -207,6 +287,9 @@ class Fsn(web3.eth.Eth):
                     raise TypeError('Error in linkToChain dictionary: Found ',val, 'but provider must be one of WebSocket, HTTP, or IPC')
             elif key == 'gateway':
                 pass          # Can be 'default'
+            elif key == 'api':
+                if not isinstance(val, dict):
+                    raise TypeError('Error in linkToChain dictionary: api must be a dict of fsnapi options, e.g. {\'timeout\': 10, \'retries\': 5}')
             elif key == 'private_key':
                 if is_string(val) and len(val) > 0:
                     private_key = val
@@ -278,12 +361,14 @@ class Fsn(web3.eth.Eth):
   
         # Connect to the fusion api 
         
-        self.api = fsnapi(self.defaultAccount, linkToChain['network'])
+        self.api = fsnapi(self.defaultAccount, linkToChain['network'], **linkToChain.get('api', {}))
+        
+        self._pubKeyInfoCache = {}      # address -> (time, info) for pubKeyInfoMany
             
         
         
         self.consts = {
-            "TimeForever":       0xffffffffffffffff, 
+            "TimeForever":       TIME_FOREVER, 
             "TimeForeverStr":   "0xffffffffffffffff",
 
             "OwnerUSANAssetID": "0xfffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffe",
@@ -303,7 +388,7 @@ class Fsn(web3.eth.Eth):
             
             "EMPTY_HASH":                            "0x0000000000000000000000000000000000000000000000000000000000000000",
             
-            "BN":                                    int('0xffffffffffffffff',16)  # 18446744073709551615, used in time locks to signify infinity
+            "BN":                                    TIME_FOREVER  # 18446744073709551615, used in time locks to signify infinity
         }
             
         self.tokens = {
@@ -352,6 +437,30 @@ class Fsn(web3.eth.Eth):
         #self.web3.middleware_onion.add(construct_sign_and_send_raw_middleware(self.acct))
         self.defaultAccount = self.acct.address
 
+
+    def unlockKeystore(self, keystore, passwords, ttl=DEFAULT_TTL, workers=4):
+        if self.vault is None:
+            self.vault = KeyVault(ttl, workers)
+        return self.vault.unlock(keystore, passwords)
+
+
+    def useAccount(self, address):
+        if self.vault is None:
+            raise PrivateKeyNotSet (
+                'No keystore has been unlocked, use unlockKeystore first'
+            )
+        self.acct = self.vault.account(address)
+        self.addAccount()
+        return self.acct
+
+
+    def lockKeystore(self, address=None):
+        if self.vault is None:
+            return
+        self.vault.lock(address)
+        if self.acct is not None and (address is None or self.acct.address.lower() == address.lower()):
+            self.acct = None
+
     def getBalance(self, account, assetId, block_identifier=None):
         if is_integer(account):
             account = self.getAddressByNotation(account)
@@ -424,7 +533,7 @@ class Fsn(web3.eth.Eth):
                 
 
 
-    def allTickets(self, block_identifier=None):
+    def allTickets(self, block_identifier=None, records=False):
         if block_identifier is None:
             block_identifier = self.defaultBlock
             
@@ -432,6 +541,8 @@ class Fsn(web3.eth.Eth):
             "fsn_allTickets",
             [block_identifier],
         )
+        if records:
+            return ticketTable(result)
         return result
 
 
@@ -443,6 +554,21 @@ class Fsn(web3.eth.Eth):
             [account, block_identifier],
         )
 
+    def exportTickets(self, path, block_identifier='latest', format=None, row_group_size=ROW_GROUP_SIZE):
+        if block_identifier == 'latest':
+            block_identifier = self.blockNumber
+        tickets = self.allTickets(hex(block_identifier) if isinstance(block_identifier, int) else block_identifier)
+        return exportTickets(tickets, path, block_identifier, format, row_group_size)
+
+    def ticketTracker(self, sync=True):
+        tracker = TicketTracker(self)
+        if sync:
+            tracker.sync()
+        return tracker
+
+    def subscribeTicketEvents(self, owners=None, kinds=None, callback=None, poll_interval=2, tracker=None):
+        return TicketEventStream(self, owners, kinds, callback, poll_interval, tracker).start()
+
     def totalNumberOfTickets(self, block_identifier=None):
         if block_identifier is None:
             block_identifier = self.defaultBlock
@@ -485,6 +611,16 @@ class Fsn(web3.eth.Eth):
         )
 
 
+    def stakingAnalytics(self, batch_size=50, workers=4, stake_every=1, path=':memory:', confirmations=30):
+        return StakingAnalytics(self, batch_size, workers, stake_every, path, confirmations)
+
+
+    def stakingSummary(self, startBlock, endBlock, frame=False):
+        if self._stakingAnalytics is None:
+            self._stakingAnalytics = StakingAnalytics(self)
+        return self._stakingAnalytics.summary(startBlock, endBlock, frame)
+
+
     def getBlockReward(self, block_identifier='latest'):
         
         if block_identifier is None:
@@ -967,7 +1103,7 @@ class Fsn(web3.eth.Eth):
 
 
 
-    def sendRawTimeLock(self, transaction, prepareOnly=False):
+    def sendRawTimeLock(self, transaction, prepareOnly=False, now=None):
 
         if prepareOnly == False:
             if self.acct == None:
@@ -996,7 +1132,7 @@ class Fsn(web3.eth.Eth):
             if transaction['gasPrice'] == 'default':
                 transaction['gasPrice'] = hex(to_wei(self.__defaultSendTimeLockGasPrice, 'ether'))    #  Fusion gas price for assetToTimeLock
         
-        Tx = buildSendToTimeLockTx(transaction, self.__defaultChainId)
+        Tx = buildSendToTimeLockTx(transaction, self.__defaultChainId, now)
 
         Txnew =  self.web3.manager.request_blocking(
             "fsntx_buildSendTimeLockTx",
@@ -1015,6 +1151,27 @@ class Fsn(web3.eth.Eth):
 
 
 
+    def vestingSchedule(self, asset, recipients, start, cliff=0, period=2592000, count=1, end='infinity'):
+        sender = self.acct.address if self.acct is not None else None
+        return VestingSchedule(asset, recipients, start, cliff, period, count, end, sender)
+    
+    
+    def sendVestingSchedule(self, schedule, journal=None, workers=4, batch_size=50, gasPrice='default', gas=None, progress=None):
+        if self.acct == None:
+            raise PrivateKeyNotSet (
+                'No private key was set for this unsigned transaction'
+            )
+        if isinstance(schedule, str):
+            if journal is None:
+                journal = schedule + '.journal'
+            schedule = VestingSchedule.load(schedule)
+        if gasPrice == 'default':
+            gasPrice = hex(to_wei(self.__defaultSendTimeLockGasPrice, 'ether'))
+        return VestingDistributor(
+            self, schedule, self.acct, self.__defaultChainId, journal, workers, batch_size, gasPrice, gas, progress
+        ).run()
+    
+    
     def assetToTimeLock(self, transaction):
         if self.acct == None:
             raise PrivateKeyNotSet (
@@ -1055,7 +1212,7 @@ class Fsn(web3.eth.Eth):
 
 
 
-    def assetToRawTimeLock(self, transaction, prepareOnly=False):
+    def assetToRawTimeLock(self, transaction, prepareOnly=False, now=None):
 
         if prepareOnly == False:
             if self.acct == None:
@@ -1084,7 +1241,7 @@ class Fsn(web3.eth.Eth):
             if transaction['gasPrice'] == 'default':
                 transaction['gasPrice'] = hex(to_wei(self.__defaultAssetToTimeLockGasPrice, 'ether'))    #  Fusion gas price for assetToTimeLock
         
-        Tx = buildAssetToTimeLockTx(transaction, self.__defaultChainId)
+        Tx = buildAssetToTimeLockTx(transaction, self.__defaultChainId, now)
 
         Txnew =  self.web3.manager.request_blocking(
             "fsntx_buildAssetToTimeLockTx",
@@ -1141,7 +1298,7 @@ class Fsn(web3.eth.Eth):
 
 
 
-    def timeLockToRawAsset(self, transaction, prepareOnly=False):
+    def timeLockToRawAsset(self, transaction, prepareOnly=False, now=None):
 
         if prepareOnly == False:
             if self.acct == None:
@@ -1169,7 +1326,7 @@ class Fsn(web3.eth.Eth):
             if transaction['gasPrice'] == 'default':
                 transaction['gasPrice'] = hex(to_wei(self.__defaultTimeLockToAssetGasPrice, 'ether'))    #  Fusion gas price for assetToTimeLock
         
-        Tx = buildTimeLockToAssetTx(transaction, self.__defaultChainId)
+        Tx = buildTimeLockToAssetTx(transaction, self.__defaultChainId, now)
         Tx =  self.web3.manager.request_blocking(
             "fsntx_buildTimeLockToAssetTx",
             [Tx],
@@ -1224,7 +1381,7 @@ class Fsn(web3.eth.Eth):
 
 
 
-    def timeLockToRawTimeLock(self, transaction, prepareOnly=False):
+    def timeLockToRawTimeLock(self, transaction, prepareOnly=False, now=None):
 
         if prepareOnly == False:
             if self.acct == None:
@@ -1252,7 +1409,7 @@ class Fsn(web3.eth.Eth):
             if transaction['gasPrice'] == 'default':
                 transaction['gasPrice'] = hex(to_wei(self.__defaultTimeLockToTimeLockGasPrice, 'ether'))    #  Fusion gas price for assetToTimeLock
         
-        Tx = buildTimeLockToTimeLockTx(transaction, self.__defaultChainId)
+        Tx = buildTimeLockToTimeLockTx(transaction, self.__defaultChainId, now)
         Txnew =  self.web3.manager.request_blocking(
             "fsntx_buildTimeLockToTimeLockTx",
             [Tx],
@@ -1304,7 +1461,7 @@ class Fsn(web3.eth.Eth):
 
 
 
-    def makeRawSwap(self, transaction, prepareOnly=False):
+    def makeRawSwap(self, transaction, prepareOnly=False, now=None):
 
         if prepareOnly == False:
             if self.acct == None:
@@ -1324,7 +1481,7 @@ class Fsn(web3.eth.Eth):
             if transaction['gasPrice'] == 'default':
                 transaction['gasPrice'] = hex(to_wei(self.__defaultMakeSwapGasPrice, 'ether'))    #  Fusion gas price for makeSwap
         
-        Tx = buildMakeSwapTx(transaction, self.__defaultChainId)
+        Tx = buildMakeSwapTx(transaction, self.__defaultChainId, now)
         Tx =  self.web3.manager.request_blocking(
             "fsntx_buildMakeSwapTx",
             [Tx],
@@ -1342,7 +1499,7 @@ class Fsn(web3.eth.Eth):
 
 
 
-    def makeRawMultiSwap(self, transaction, prepareOnly=False):
+    def makeRawMultiSwap(self, transaction, prepareOnly=False, now=None):
         if not isinstance(transaction,dict):
             raise TypeError(
                 'This does not look like a dict that is required for the makeRawMultiSwap method'
@@ -1358,7 +1515,7 @@ class Fsn(web3.eth.Eth):
             if transaction['gasPrice'] == 'default':
                 transaction['gasPrice'] = hex(to_wei(self.__defaultMakeSwapGasPrice, 'ether'))    #  Fusion gas price for makeSwap
         
-        Tx = buildMakeMultiSwapTx(transaction, self.__defaultChainId)
+        Tx = buildMakeMultiSwapTx(transaction, self.__defaultChainId, now)
         
         #print('\n',Tx,'\n')
         
@@ -1670,7 +1827,7 @@ class Fsn(web3.eth.Eth):
             
             
         
-    def getAsset(self, assetId, block_identifier=None):
+    def getAsset(self, assetId, block_identifier=None, records=False):
         if not is_hexstr(assetId):
             raise TypeError(
                 'assetId must be a hex string'
@@ -1684,6 +1841,8 @@ class Fsn(web3.eth.Eth):
             "fsn_getAsset",
             [assetId, block_identifier],
         )
+        if records and asset_dict is not None:
+            return assetInfo(asset_dict)
         return asset_dict
 
 
@@ -1814,7 +1973,7 @@ class Fsn(web3.eth.Eth):
 
 
         
-    def getTimeLockBalance(self, assetId, account, block_identifier=None):
+    def getTimeLockBalance(self, assetId, account, block_identifier=None, records=False):
         if is_integer(account):
             account = to_hex(account)
         if not is_address(account):
@@ -1834,9 +1993,47 @@ class Fsn(web3.eth.Eth):
             "fsn_getTimeLockBalance",
             [assetId, account, block_identifier],
         )
+        if records and timelock_dict is not None:
+            return timeLockRecord(timelock_dict)
         return timelock_dict
     
     
+    def simulateTimeLockMove(self, kind, transaction, now=None, balance=None, timelock=None, block_identifier=None):
+        #
+        # kind is 'assetToTimeLock', 'timeLockToTimeLock' or 'timeLockToAsset'. The sender's balance and time lock
+        # are read from the node unless given. Raises TimeLockShortfall if the node would reject the move
+        #
+        if kind not in ('assetToTimeLock', 'timeLockToTimeLock', 'timeLockToAsset'):
+            raise ValueError(
+                'Error in simulateTimeLockMove: unknown kind of move ', kind
+            )
+        now = referenceTime(now)
+        sender = transaction['from']
+        assetId = transaction['asset']
+        value = hex_to_integer(transaction['value']) if is_hexstr(transaction['value']) else int(transaction['value'])
+        toSelf = 'to' in transaction and transaction['to'].lower() == sender.lower()
+        
+        if timelock is None:
+            timelock = self.getTimeLockBalance(assetId, sender, block_identifier)
+        if not isinstance(timelock, LockSegments):
+            timelock = LockSegments(timelock, now)
+        if balance is None and kind != 'timeLockToTimeLock':
+            balance = self.getBalance(sender, assetId, block_identifier)
+        
+        if kind == 'timeLockToAsset':
+            return planTimeLockToAsset(timelock, value, now, balance, toSelf)
+        times = []
+        for key in ['start', 'end']:
+            t = transaction.get(key)
+            if t is not None and not is_integer(t):
+                t = hex_to_integer(to_hex_if_datestring(t, now))
+            times.append(t)
+        startTime, endTime = times
+        if kind == 'assetToTimeLock':
+            return planAssetToTimeLock(balance, timelock, value, startTime, endTime, now, toSelf)
+        return planTimeLockToTimeLock(timelock, value, startTime, endTime, now, toSelf)
+    
+    
     def getAllBalances(self, account, block_identifier=None):
         if is_integer(account):
             account = to_hex(account)
@@ -1856,7 +2053,7 @@ class Fsn(web3.eth.Eth):
         return timelock_dict   
     
         
-    def getAllTimeLockBalances(self, account, block_identifier=None):
+    def getAllTimeLockBalances(self, account, block_identifier=None, records=False):
         if is_integer(account):
             account = to_hex(account)
         if not is_address(account):
@@ -1872,6 +2069,8 @@ class Fsn(web3.eth.Eth):
             "fsn_getAllTimeLockBalances",
             [account, block_identifier],
         )
+        if records and timelock_dict is not None:
+            return {assetId: timeLockRecord(timelock) for assetId, timelock in timelock_dict.items()}
         return timelock_dict       
     
     
@@ -1886,18 +2085,16 @@ class Fsn(web3.eth.Eth):
             raise TypeError(
                 'assetId must be a hex string'
             )
-        if not is_hex(startTime):
-            if is_integer(startTime):
-                startTime = to_hex(startTime)
-            else:
-                raise TypeError(
+        if is_hexstr(startTime):
+            startTime = hex_to_integer(startTime)
+        elif not is_integer(startTime):
+            raise TypeError(
                 'The startTime does not have a valid format'
             )
-        if not is_hex(endTime):
-            if is_integer(endTime):
-                endTime = to_hex(endTime)
-            else:
-                raise TypeError(
+        if is_hexstr(endTime):
+            endTime = hex_to_integer(endTime)
+        elif not is_integer(endTime):
+            raise TypeError(
                 'The endTime does not have a valid format'
             )
         if block_identifier is None:
@@ -1907,54 +2104,62 @@ class Fsn(web3.eth.Eth):
 
         timelock_dict =  self.web3.manager.request_blocking(
             "fsn_getTimeLockValueByInterval",
-            [account, block_identifier],
+            [assetId, account, startTime, endTime, block_identifier],
         )
         return timelock_dict   
             
     
-    def getAllSwaps(self, pageNo):
+    def timeLockIndex(self):
+        return TimeLockIndex(self)
+    
+    
+    def getAllSwaps(self, pageNo, columnar=False, exact_amounts=False, records=False):
         
-        swap_rawdict = self.api.fsnapi_swaps(pageNo)
+        swap_rawdict = [row for row in self.api.fsnapi_swaps(pageNo) if isinstance(row, dict)]
         
         #print('swaps = ',swap_rawdict)
         
-        swap_dict = [{k:[] for k in ['swapID', 'timeStamp', 'fromAddress', 'fromAsset', 'toAsset', 'recCreated',
-                                    'height', 'timeStamp', 'hash', 'size', 'Description', 
-                                    'FromStartTime', 'ToEndTime', 'MinFromAmount', 'MinToAmount', 
-                                    'SwapSize', 'Targes', 'Time', 'ToAssetID'
-                                    ]
-        } for ii in range(len(swap_rawdict)-1)]
-        
-        for ii in range(len(swap_rawdict)-1):
-        
-            data_string = swap_rawdict[ii]['data']
-            #print(data_string)
-            data_dict = json.loads(data_string)
-            
-            swap_dict[ii]['swapID'] = swap_rawdict[ii]['swapID']
-            swap_dict[ii]['timeStamp'] = swap_rawdict[ii]['timeStamp']
-            swap_dict[ii]['fromAddress'] = swap_rawdict[ii]['fromAddress']
-            swap_dict[ii]['fromAsset'] = swap_rawdict[ii]['fromAsset']
-            swap_dict[ii]['toAsset'] = swap_rawdict[ii]['toAsset']
-            swap_dict[ii]['recCreated'] = swap_rawdict[ii]['recCreated']
-            swap_dict[ii]['height'] = swap_rawdict[ii]['height']
-            swap_dict[ii]['hash'] = swap_rawdict[ii]['hash']
-            swap_dict[ii]['size'] = swap_rawdict[ii]['size']
-            swap_dict[ii]['Description'] = data_dict['Description']
-            swap_dict[ii]['FromStartTime'] = data_dict['FromStartTime']
-            swap_dict[ii]['ToEndTime'] = data_dict['ToEndTime']
-            swap_dict[ii]['MinFromAmount'] = data_dict['MinFromAmount']
-            swap_dict[ii]['MinToAmount'] = data_dict['MinToAmount']
-            swap_dict[ii]['SwapSize'] = data_dict['SwapSize']
-            swap_dict[ii]['Targes'] = data_dict['Targes']
-            swap_dict[ii]['Time'] = data_dict['Time']
-            swap_dict[ii]['ToAssetID'] = data_dict['ToAssetID']
+        if columnar:
+            return self.swapTable(swap_rawdict, columnar, exact_amounts)
         
+        if records:
+            return [Swap.fromRow(row) for row in swap_rawdict]
         
+        swap_dict = [dict(LazySwap(row)) for row in swap_rawdict]
         
         return swap_dict
 
 
+    def getSwapTable(self, columnar='arrays', exact_amounts=False, page_size=1000, prefetch=2):
+        return self.swapTable(self.api.iterSwaps(page_size, prefetch), columnar, exact_amounts)
+
+
+    def swapTable(self, rows, columnar='arrays', exact_amounts=False):
+        if columnar not in [True, 'arrays', 'frame']:
+            raise ValueError(
+                'columnar must be \'arrays\' or \'frame\''
+            )
+        columns = swapsToColumns(rows, exact_amounts)
+        if columnar == 'frame':
+            return columnsToFrame(columns)
+        return columns
+
+
+    def swapBook(self, load=True, page_size=1000, prefetch=2):
+        book = SwapBook()
+        if load:
+            book.load(self.api, page_size, prefetch)
+        return book
+    
+    
+    def iterSwaps(self, page_size=1000, prefetch=2):
+        return self.api.iterSwaps(page_size, prefetch)
+
+
+    def exportSwaps(self, path, format=None, row_group_size=ROW_GROUP_SIZE, page_size=1000, prefetch=2):
+        return exportSwaps(self.api.iterSwaps(page_size, prefetch), path, format, row_group_size)
+
+
     
     def getSwap(self, txHash, block_identifier='latest'):
         if not is_hexstr(txHash):
@@ -1998,7 +2203,13 @@ class Fsn(web3.eth.Eth):
     
     
     def fsnapiVerifiedAssetInfo(self):
-        asset_dict = self.api.fsnapiVerifiedAssetInfo()
+        #
+        # The filtered list only changes when the api's cached answer does. The answer and its version
+        # are read together, as a background revalidation can replace the answer at any time
+        #
+        asset_dict, version = self.api.fsnapiVerifiedAssetInfo(versioned=True)
+        if self._verifiedAssets is not None and self._verifiedAssets[0] == version:
+            return list(self._verifiedAssets[1])
         
         verified_assets = []
         ii = 0
@@ -2008,8 +2219,10 @@ class Fsn(web3.eth.Eth):
                 if not asset['disabled'] and asset['whiteListEnabled']:
                     ii = ii+1
                     verified_assets.append(asset['shortName'])
+        
+        self._verifiedAssets = (version, verified_assets)
                     
-        return verified_assets
+        return list(verified_assets)
     
     
     def assetIdToAssetInfo(self, asset_Id):
@@ -2043,14 +2256,29 @@ class Fsn(web3.eth.Eth):
         return target_swaps
     
     
+    def iterSwapsPubkey(self, pubKey, page_size=100, prefetch=2):
+        return self.api.iterSwapsPubkey(pubKey, page_size, prefetch)
+    
+    
+    def iterSwapsTarget(self, pubKey, page_size=100, prefetch=2):
+        return self.api.iterSwapsTarget(pubKey, page_size, prefetch)
+    
+    
     def fsnapiAssetAllInfo(self, pageNo):
         return self.api.fsnapiAssetAllInfo(pageNo)
 
 
 
     def pubKeyInfo(self, pubKey):
-        add_info = self.api.pubKeyInfo(pubKey)['address'][0]
-        balanceInfo = json.loads(add_info['balanceInfo'])
+        reply = self.api.pubKeyInfo(pubKey)
+        if not isinstance(reply, dict) or not isinstance(reply.get('address'), list) or len(reply['address']) == 0:
+            raise ValueError('Error in pubKeyInfo: The api has no information for ',pubKey,reply)
+        add_info = reply['address'][0]
+        if not isinstance(add_info, dict):
+            raise ValueError('Error in pubKeyInfo: Unexpected reply from the api for ',pubKey,add_info)
+        balanceInfo = add_info.get('balanceInfo')
+        if isinstance(balanceInfo, str):
+            balanceInfo = json.loads(balanceInfo)
             
         info_dict = {
             'recCreated':           add_info['recCreated'],
@@ -2066,6 +2294,27 @@ class Fsn(web3.eth.Eth):
         return info_dict
     
     
+    def pubKeyInfoMany(self, addresses, workers=8, cache_ttl=300):
+        #
+        # Yields (address, info, error) as the lookups complete. error is None on success, otherwise info is None.
+        # Successful answers are cached for cache_ttl seconds.
+        #
+        now = time.time()
+        todo = []
+        for address in addresses:
+            cached = self._pubKeyInfoCache.get(address.lower())
+            if cached is not None and now - cached[0] < cache_ttl:
+                yield address, cached[1], None
+            else:
+                todo.append(address)
+        
+        for address, info, error in self.api.iterConcurrent(
+                self.pubKeyInfo, todo, workers, errors=(FsnApiError, ValueError, KeyError, TypeError)):
+            if error is None:
+                self._pubKeyInfoCache[address.lower()] = (time.time(), info)
+            yield address, info, error
+    
+    
     def fsnprice(self):
         return self.api.fsnprice()
     
@@ -2076,6 +2325,14 @@ class Fsn(web3.eth.Eth):
         else:
             return numToDatetime(tdelta)
  
+    def numsToDatetimes(self, times, numpy=False):
+        if numpy:
+            return numsToDatetime64(times)
+        return numsToDatetimes(times)
+    
+    def timeLockItemsToDatetimes(self, items, numpy=None):
+        return timeLockItemsToDatetimes(items, numpy)
+ 
     def datetimeToHex(self, dt):
         return datetimeToHex(dt)
     
@@ -2095,10 +2352,32 @@ class Fsn(web3.eth.Eth):
             block_identifier = block_number_formatter(block_identifier)
             
         
-        return int(self.web3.manager.request_blocking(
+        return self.web3.manager.request_blocking(
             "eth_getBlockByNumber",
             [block_identifier, True],
-        ))
+        )
+    
+    
+    def blockIngester(self, sink=None, batch_size=20, workers=4, include_failed=False):
+        return BlockIngester(self, sink, batch_size, workers, include_failed)
+    
+    
+    def ingestBlocks(self, startBlock, endBlock=None, sink=None, batch_size=20, workers=4, include_failed=False):
+        if sink is None:
+            return BlockIngester(self, None, batch_size, workers, include_failed).iterEvents(startBlock, endBlock)
+        return BlockIngester(self, sink, batch_size, workers, include_failed).run(startBlock, endBlock)
+    
+    
+    def exportBlocks(self, directory, startBlock, endBlock=None, format=None, row_group_size=ROW_GROUP_SIZE,
+                     kinds=None, batch_size=20, workers=4):
+        with EventExporter(directory, format, row_group_size, kinds) as exporter:
+            BlockIngester(self, exporter, batch_size, workers).run(startBlock, endBlock)
+        return exporter.lastBlock
+    
+    
+    def blockFollower(self, consumers=(), checkpoint=None, depth=64, confirmations=0, poll_interval=2,
+                      batch_size=20, workers=4):
+        return BlockFollower(self, consumers, checkpoint, depth, confirmations, poll_interval, batch_size, workers)
     
     
     def getTransactionByBlockNumberAndIndex(self, indx, block_identifier=None):
@@ -2123,6 +2402,15 @@ class Fsn(web3.eth.Eth):
     
     def takeSwapsDesc(self, pageNo):
         return self.api.takeSwapsDesc(pageNo)
+    
+    
+    def transactionStore(self):
+        return self.api.transactionStore()
+    
+    
+    def crawlTransactions(self, startPage=0, endPage=None, workers=8, checkpoint=None, resume=False, noTickets=False):
+        crawler = TransactionCrawler(self.api, workers=workers, checkpoint=checkpoint, noTickets=noTickets)
+        return crawler.crawl(startPage, endPage, resume)
  
     
     #def estimateGas(self, transaction, block_identifier=None):
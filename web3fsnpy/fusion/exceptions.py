@@ -19,3 +19,58 @@ class PrivateKeyNotSet(Exception):
     Checks that a private key was supplied for an unsigned transaction
     """
     pass
+class AccountLocked(PrivateKeyNotSet):
+    """
+    The key vault has no key for the address, or its key has expired
+    """
+    pass
+
+
+class FsnApiError(Exception):
+    """
+    Base class for errors raised while talking to Fusion's api
+    """
+    def __init__(self, message, url=None):
+        super().__init__(message)
+        self.url = url
+class FsnApiTimeout(FsnApiError):
+    """
+    The api did not answer within the configured timeout
+    """
+    pass
+class FsnApiConnectionError(FsnApiError):
+    """
+    The api could not be reached, even after retrying
+    """
+    pass
+class FsnApiHTTPError(FsnApiError):
+    """
+    The api answered with a status code other than 200
+    """
+    def __init__(self, message, url=None, status_code=None):
+        super().__init__(message, url)
+        self.status_code = status_code
+class FsnApiDecodeError(FsnApiError):
+    """
+    The api answered with something that is not valid JSON
+    """
+    pass
+
+
+class ReorgTooDeep(Exception):
+    """
+    The chain reorganised below the oldest block remembered by a BlockFollower
+    """
+    def __init__(self, message, height=None):
+        super().__init__(message)
+        self.height = height
+
+
+class TimeLockShortfall(ValueError):
+    """
+    A planned time lock move is not covered by the sender's balance or time lock.
+    gaps is a list of (startTime, endTime, missing value)
+    """
+    def __init__(self, message, gaps=None):
+        super().__init__(message)
+        self.gaps = gaps or []
@@ -7,21 +7,193 @@
 #
 import os
 import sys
-import urllib.request
 import json
+import codecs
 import datetime
 
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .fsn_registry import (
+    AssetRegistry,
+)
+
+from .fsn_crawler import (
+    TX_PAGE_SIZE,
+)
+from .fsn_txstore import (
+    TransactionStore,
+)
+
+from .fsn_cache import (
+    ResponseCache,
+)
+
+from .exceptions import (
+    FsnApiTimeout,
+    FsnApiConnectionError,
+    FsnApiHTTPError,
+    FsnApiDecodeError,
+)
+
 #import pdb ; pdb.set_trace()
 
+
+API_DEFAULTS = {
+    'timeout':          (5, 30),     # (connect, read) timeout in seconds
+    'retries':          3,           # Retries on connection errors and on 429/5xx replies
+    'backoff_factor':   0.3,         # Sleep between retries is backoff_factor * 2**(retry-1) seconds
+    'pool_connections': 4,           # Number of host pools to cache
+    'pool_maxsize':     16,          # Keep-alive connections kept open per host
+    'registry_path':    None,        # SQLite file of the local asset registry, defaults to ~/.web3fsnpy/assets-<network>.sqlite
+    'registry_refresh': 600,         # Seconds between background refreshes of the asset registry
+    'cache_ttl':        None,        # Per endpoint cache TTL in seconds, e.g. {'fsnprice': 30, 'assets/verified': 3600}
+    'cache_stale':      True,        # Serve a stale cached answer while it is revalidated in the background
+    'txstore_path':     None,        # SQLite file of the local transaction store, defaults to ~/.web3fsnpy/transactions-<network>.sqlite
+}
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+STREAM_CHUNK_SIZE = 65536
+
+
+SWAP_ROW_FIELDS = ['swapID', 'timeStamp', 'fromAddress', 'fromAsset', 'toAsset', 'recCreated',
+                   'height', 'hash', 'size']
+
+SWAP_DATA_FIELDS = ['Description', 'FromStartTime', 'ToEndTime', 'MinFromAmount', 'MinToAmount',
+                    'SwapSize', 'Targes', 'Time', 'ToAssetID']
+
+
+def iterJsonArray(chunks):
+    #
+    # Incrementally decode a top level JSON array from an iterable of byte chunks, yielding each element as
+    # soon as it is complete. Only the undecoded tail of the stream is held in memory.
+    #
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    started = False
+    first = True            # Nothing read yet after '[', so ']' may close an empty array
+    separated = False       # The last element read was followed by its ','
+    exhausted = False
+
+    def more():
+        nonlocal buf, pos, exhausted
+        for chunk in chunks:
+            text = utf8.decode(chunk)
+            if text:
+                buf = buf[pos:] + text
+                pos = 0
+                return True
+        buf = buf[pos:] + utf8.decode(b'', final=True)
+        pos = 0
+        exhausted = True
+        return False
+
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+        if pos == len(buf):
+            if exhausted:
+                raise ValueError('Unexpected end of JSON array')
+            more()
+            continue
+        if not started:
+            if buf[pos] != '[':
+                raise ValueError('Expected a JSON array but found {!r}'.format(buf[pos:pos+20]))
+            started = True
+            pos += 1
+            continue
+        if not first and not separated:
+            #
+            # Exactly one ',' between elements, or the closing ']'
+            #
+            if buf[pos] == ']':
+                return
+            if buf[pos] != ',':
+                raise ValueError("Expected ',' or ']' in JSON array but found {!r}".format(buf[pos:pos+20]))
+            separated = True
+            pos += 1
+            continue
+        if buf[pos] == ']' and first:
+            return
+        if buf[pos] in ',]':
+            raise ValueError('Missing element in JSON array at {!r}'.format(buf[pos:pos+20]))
+        try:
+            element, end = decoder.raw_decode(buf, pos)
+            follow = end
+            while follow < len(buf) and buf[follow] in ' \t\r\n':
+                follow += 1
+            # An element must be followed by ',' or ']'. Anything else means the chunk split it, e.g. '12' of '12.5'
+            complete = follow < len(buf) and buf[follow] in ',]'
+        except ValueError:
+            complete = False
+        if not complete:
+            if exhausted:
+                raise ValueError('Malformed or truncated JSON element at offset {}'.format(pos))
+            more()
+            continue
+        pos = end
+        first = False
+        separated = False
+        yield element
+
+
+class LazySwap(Mapping):
+    """
+    Read only view of one swap row from the api. The JSON in the row's 'data' field is only
+    decoded the first time one of its fields is accessed. dict(swap) gives the same fields as getAllSwaps
+    """
+    __slots__ = ('raw', '_data')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self.raw['data'])
+        return self._data
+
+    def __getitem__(self, key):
+        if key in SWAP_ROW_FIELDS:
+            return self.raw[key]
+        if key in SWAP_DATA_FIELDS:
+            return self.data[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from SWAP_ROW_FIELDS
+        yield from SWAP_DATA_FIELDS
+
+    def __len__(self):
+        return len(SWAP_ROW_FIELDS) + len(SWAP_DATA_FIELDS)
+
+    def __repr__(self):
+        return 'LazySwap({})'.format(self.raw.get('swapID'))
+
+
 class fsnapi:
 
     public_key = None
     url_api = None
     api = None
+    session = None
+    registry = None
+    txstore = None
 
 
-    def __init__(self, pub_key, network=None):
+    def __init__(self, pub_key, network=None, **options):
         self.public_key = pub_key 
+        self.network = network
         
         if network == 'mainnet':
             self.url_api = 'https://api.fusionnetwork.io/'
@@ -30,6 +202,14 @@ class fsnapi:
         else:
             raise TypeError('Error in fsnapi: network not set')
         
+        for key in options:
+            if key not in API_DEFAULTS:
+                raise TypeError('Error in fsnapi: Illegal option ',key)
+        self.options = dict(API_DEFAULTS, **options)
+        self.timeout = self.options['timeout']
+        self.session = self._newSession()
+        self.cache = ResponseCache(self._revalidate, self.options['cache_ttl'], self.options['cache_stale'])
+        
         self.assetInfoUrl = self.url_api + 'assets/verified?page=0&size=100&sort=desc' 
         
         
@@ -38,16 +218,117 @@ class fsnapi:
         self.priceUrl = self.url_api + 'fsnprice'
         
 
-    def fsnprice(self):
+    def _newSession(self):
+        #
+        # A single keep-alive session is shared by every call, so repeated requests reuse the TCP/TLS connection
+        #
+        retry = Retry(
+            total=self.options['retries'],
+            connect=self.options['retries'],
+            read=self.options['retries'],
+            status=self.options['retries'],
+            backoff_factor=self.options['backoff_factor'],
+            status_forcelist=RETRY_STATUS_CODES,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.options['pool_connections'],
+            pool_maxsize=self.options['pool_maxsize'],
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Accept': 'application/json'})
+        return session
+
+
+    def close(self):
+        if self.registry is not None:
+            self.registry.close()
+        if self.txstore is not None:
+            self.txstore.close()
+        if self.session is not None:
+            self.session.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def _request(self, url, stream=False, headers=None):
+        try:
+            response = self.session.get(url, timeout=self.timeout, stream=stream, headers=headers)
+        except requests.exceptions.Timeout as e:
+            raise FsnApiTimeout('Timed out fetching {}'.format(url), url) from e
+        except requests.exceptions.RequestException as e:
+            raise FsnApiConnectionError('Could not fetch {}: {}'.format(url, e), url) from e
+        
+        if response.status_code != 200 and not (headers and response.status_code == 304):
+            response.close()
+            raise FsnApiHTTPError(
+                'The api returned HTTP {} for {}'.format(response.status_code, url), url, response.status_code
+            )
+        return response
+
+
+    def _get(self, url):
+        response = self._request(url)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise FsnApiDecodeError('The api returned invalid JSON for {}'.format(url), url) from e
+
+
+    def _revalidate(self, url, entry):
+        #
+        # Conditional GET for the cache. Returns None if the api says that the cached body is still current
+        #
+        headers = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers['If-None-Match'] = entry.etag
+            if entry.lastModified is not None:
+                headers['If-Modified-Since'] = entry.lastModified
+        response = self._request(url, headers=headers)
+        if response.status_code == 304:
+            response.close()
+            return None
+        try:
+            value = response.json()
+        except ValueError as e:
+            raise FsnApiDecodeError('The api returned invalid JSON for {}'.format(url), url) from e
+        return value, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+    def _getCached(self, url, endpoint, versioned=False):
+        if versioned:
+            return self.cache.getVersioned(url, endpoint)
+        return self.cache.get(url, endpoint)
+
+
+    def streamJsonArray(self, url):
+        #
+        # Decode a page that is a JSON array element by element as it arrives from the socket,
+        # instead of holding the raw bytes, the decoded text and the object tree all at once
+        #
+        response = self._request(url, stream=True)
         try:
-            response = urllib.request.urlopen(self.priceUrl)
-        except:
-            return('-1')
-            
-            
-        apifsnPrice = response.read()
-        apifsnPrice = apifsnPrice.decode("utf-8")
-        priceInfo = json.loads(apifsnPrice)
+            yield from iterJsonArray(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+        except requests.exceptions.RequestException as e:
+            raise FsnApiConnectionError('Connection lost while reading {}: {}'.format(url, e), url) from e
+        except ValueError as e:
+            raise FsnApiDecodeError('The api returned invalid JSON for {}: {}'.format(url, e), url) from e
+        finally:
+            response.close()
+
+
+    def fsnprice(self):
+        priceInfo = self._getCached(self.priceUrl, 'fsnprice')
         
         #print(pkInfo)
         
@@ -56,61 +337,36 @@ class fsnapi:
         
         
         
-    def fsnapi_swaps(self, pageNo):
+    def fsnapi_swaps(self, pageNo, size=10000):
         
-        swapurl = self.url_api + 'swaps2/all?page={}&size=10000&sort=desc'.format(pageNo) 
-        
-        
-        try:
-            response = urllib.request.urlopen(swapurl)
-        except:
-            return('-1')
+        swapurl = self.url_api + 'swaps2/all?page={}&size={}&sort=desc'.format(pageNo, size) 
         
         
-        apifsn = response.read()
-        apifsn = apifsn.decode("utf-8")
-        swap_dict = json.loads(apifsn)
+        swap_dict = list(self.streamJsonArray(swapurl))
         
         #print(swap_dict)
         
         return swap_dict
     
     
-    def fsnapi_swaps_pubkey(self, pubKey, pageNo):
+    def fsnapi_swaps_pubkey(self, pubKey, pageNo, size=100):
         
-        swapurl = self.url_api + 'swaps2/all?page={}&size=100&sort=desc&address='.format(pageNo) + pubKey 
+        swapurl = self.url_api + 'swaps2/all?page={}&size={}&sort=desc&address='.format(pageNo, size) + pubKey 
         
         
-        try:
-            response = urllib.request.urlopen(swapurl)
-        except:
-            print('Exception in fsnapi_swaps_pubkey')
-            return('-1')
-        
-        
-        apifsn = response.read()
-        apifsn = apifsn.decode("utf-8")
-        swap_dict = json.loads(apifsn)
+        swap_dict = self._get(swapurl)
         
         #print(swap_dict)
         
         return swap_dict
 
     
-    def fsnapi_swaps_target(self, pubKey, pageNo):
+    def fsnapi_swaps_target(self, pubKey, pageNo, size=100):
         
-        swapurl = self.url_api + 'swaps2/all?page={}&size=100&sort=desc&target='.format(pageNo) + pubKey 
+        swapurl = self.url_api + 'swaps2/all?page={}&size={}&sort=desc&target='.format(pageNo, size) + pubKey 
         #print(swapurl)
         
-        try:
-            response = urllib.request.urlopen(swapurl)
-        except:
-            return('-1')
-        
-        
-        apifsn = response.read()
-        apifsn = apifsn.decode("utf-8")
-        swap_dict = json.loads(apifsn)
+        swap_dict = self._get(swapurl)
         
         #print(swap_dict)
         
@@ -118,17 +374,105 @@ class fsnapi:
     
     
     
-    def fsnapiVerifiedAssetInfo(self):
-        
+    def iterPageResults(self, fetchPage, page_size, prefetch=2, startPage=0, endPage=None, workers=None):
+        #
+        # Yield (pageNo, rows) for consecutive pages in order, while up to 'prefetch' following pages are
+        # downloaded in the background by 'workers' threads. Stops after the first page holding fewer
+        # than page_size rows, or before endPage.
+        #
+        if prefetch < 0:
+            raise ValueError('In iterPageResults, prefetch must be >= 0')
+        if workers is None:
+            workers = max(1, prefetch)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+        nextPage = startPage
+
+        def submitNext():
+            nonlocal nextPage
+            if endPage is None or nextPage < endPage:
+                pending.append((nextPage, executor.submit(fetchPage, nextPage)))
+                nextPage += 1
+
         try:
-            response = urllib.request.urlopen(self.assetInfoUrl)
-        except:
-            return('-1')
-        
-        
-        apifsnAssets = response.read()
-        apifsnAssets = apifsnAssets.decode("utf-8")
-        assetInfo = json.loads(apifsnAssets)
+            for ii in range(prefetch + 1):
+                submitNext()
+            while pending:
+                pageNo, future = pending.popleft()
+                rows = [row for row in future.result() if isinstance(row, dict)]
+                yield pageNo, rows
+                if len(rows) < page_size:
+                    return
+                submitNext()
+        finally:
+            for pageNo, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+    def iterConcurrent(self, fn, items, workers=8, errors=(Exception,)):
+        #
+        # Yield (item, result, error) for fn(item) over items, in the order the calls complete.
+        # At most 2*workers calls are queued at a time, so items may be a long generator.
+        #
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = {}
+        items = iter(items)
+        try:
+            while True:
+                for item in items:
+                    pending[executor.submit(fn, item)] = item
+                    if len(pending) >= 2*workers:
+                        break
+                if not pending:
+                    return
+                done, notDone = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except errors as e:
+                        yield item, None, e
+                        continue
+                    yield item, result, None
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+    def iterPages(self, fetchPage, page_size, prefetch=2, startPage=0):
+        #
+        # As iterPageResults, but yields the rows themselves
+        #
+        for pageNo, rows in self.iterPageResults(fetchPage, page_size, prefetch, startPage):
+            yield from rows
+
+
+    def iterSwaps(self, page_size=1000, prefetch=2):
+        fetch = lambda pageNo: self.fsnapi_swaps(pageNo, page_size)
+        for row in self.iterPages(fetch, page_size, prefetch):
+            yield LazySwap(row)
+
+
+    def iterSwapsPubkey(self, pubKey, page_size=100, prefetch=2):
+        fetch = lambda pageNo: self.fsnapi_swaps_pubkey(pubKey, pageNo, page_size)
+        for row in self.iterPages(fetch, page_size, prefetch):
+            yield LazySwap(row)
+
+
+    def iterSwapsTarget(self, pubKey, page_size=100, prefetch=2):
+        fetch = lambda pageNo: self.fsnapi_swaps_target(pubKey, pageNo, page_size)
+        for row in self.iterPages(fetch, page_size, prefetch):
+            yield LazySwap(row)
+
+
+
+    def fsnapiVerifiedAssetInfo(self, versioned=False):
+        #
+        # With versioned=True, (assetInfo, cache version of assetInfo)
+        #
+        assetInfo = self._getCached(self.assetInfoUrl, 'assets/verified', versioned)
         
         #print(assetInfo)
         
@@ -138,17 +482,9 @@ class fsnapi:
     
     def fsnapiAssetAllInfo(self, pageNo=0):
         
-        assetAllInfoUrl = self.url_api + 'assets/all?page={}size=100&sort=desc'.format(pageNo)
-        
-        try:
-            response = urllib.request.urlopen(assetAllInfoUrl)
-        except:
-            return('-1')
-        
+        assetAllInfoUrl = self.url_api + 'assets/all?page={}&size=100&sort=desc'.format(pageNo)
         
-        apifsnAssets = response.read()
-        apifsnAssets = apifsnAssets.decode("utf-8")
-        assetInfo = json.loads(apifsnAssets)
+        assetInfo = list(self.streamJsonArray(assetAllInfoUrl))
         
         #print(assetInfo)
         
@@ -157,44 +493,35 @@ class fsnapi:
         
         
         
-    def assetNameToAssetInfo(self, asset_name):
+    def assetRegistry(self):
+        if self.registry is None:
+            self.registry = AssetRegistry(
+                self, path=self.options['registry_path'], refresh_interval=self.options['registry_refresh']
+            )
+        return self.registry
         
-        assetInfo = self.fsnapiAssetInfo()
         
-        for asset in assetInfo:
-            if asset['shortName'] == asset_name:
-                return asset
-        return None
+    def transactionStore(self):
+        if self.txstore is None:
+            self.txstore = TransactionStore(self, path=self.options['txstore_path'])
+        return self.txstore
         
         
-    
-    def assetIdToAssetInfo(self, asset_Id):
+    def assetNameToAssetInfo(self, asset_name):
         
-        assetInfo = self.fsnapiAssetAllInfo()
+        return self.assetRegistry().assetNameToAssetInfo(asset_name)
         
-        #print(assetInfo)
         
-        for assetblock in assetInfo:
-            asset = json.loads(assetblock['data'])
-            
-            if asset['AssetID'] == asset_Id:
-                #print(asset)
-                return asset
-        return None
+    
+    def assetIdToAssetInfo(self, asset_Id):
+        
+        return self.assetRegistry().assetIdToAssetInfo(asset_Id)
 
 
     
     def pubKeyInfo(self, pubKey):
         
-        try:
-            response = urllib.request.urlopen(self.pubkeyInfoUrl + pubKey)
-        except:
-            return('-1')
-            
-            
-        apifsnPk = response.read()
-        apifsnPk = apifsnPk.decode("utf-8")
-        pkInfo = json.loads(apifsnPk)
+        pkInfo = self._get(self.pubkeyInfoUrl + pubKey)
         
         #print(pkInfo)
         
@@ -206,33 +533,19 @@ class fsnapi:
         
         # e.g. https://testnetapi.fusionnetwork.io/transactions/all?page=18&returnTickets=notickets
     
-        txPage = self.url_api + 'transactions/all?sort=desc&page={}&returnTickets=notickets'.format(pageNo)
+        txPage = self.url_api + 'transactions/all?sort=desc&page={}&size={}&returnTickets=notickets'.format(pageNo, TX_PAGE_SIZE)
         
-        try:
-            response = urllib.request.urlopen(txPage)
-        except:
-            return('-1')
-    
-        txInfo = response.read()
-        txInfo = txInfo.decode("utf-8")
-        txInfo = json.loads(txInfo)
+        txInfo = self._get(txPage)
         
         return txInfo
     
     
     def transactionsDesc(self, pageNo):
         
-        txPage = self.url_api + 'transactions/all?sort=desc&page={}&size=100&field=height'.format(pageNo)
-        print(txPage)
+        txPage = self.url_api + 'transactions/all?sort=desc&page={}&size={}&field=height'.format(pageNo, TX_PAGE_SIZE)
+        #print(txPage)
         
-        try:
-            response = urllib.request.urlopen(txPage)
-        except:
-            return('-1')
-    
-        txInfo = response.read()
-        txInfo = txInfo.decode("utf-8")
-        txInfo = json.loads(txInfo)
+        txInfo = list(self.streamJsonArray(txPage))
         
         return txInfo
     
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+#
+"""
+    HTTP cache for the slow changing endpoints of Fusion's api, using conditional requests
+    (ETag / Last-Modified) and serving stale data while it is revalidated in the background.
+"""
+#
+#
+import time
+import threading
+
+
+CACHE_TTL = {
+    'fsnprice':         60,      # Seconds an answer is served without asking the api again
+    'assets/verified':  600,
+}
+
+
+class CacheEntry:
+
+    __slots__ = ('value', 'etag', 'lastModified', 'fetched', 'version', 'revalidating')
+
+    def __init__(self, value, etag, lastModified):
+        self.value = value
+        self.etag = etag
+        self.lastModified = lastModified
+        self.fetched = time.time()
+        self.version = 0
+        self.revalidating = False
+
+
+class ResponseCache:
+    """
+    Cache of decoded api answers keyed by url.
+
+    An answer younger than its endpoint's TTL is returned directly. An older one is returned at once
+    too, while a background thread asks the api whether it changed (a conditional GET, so an unchanged
+    body is not downloaded again). With stale=False the revalidation is done before returning instead.
+
+    Every time the body of a url changes it gets a new version number, so callers can memoize
+    anything derived from it. getVersioned returns the value together with its version, as the value
+    returned by get may already have been replaced when version is called.
+    """
+
+    def __init__(self, fetch, ttl=None, stale=True):
+        #
+        # fetch(url, entry) returns (value, etag, lastModified) or None if the api answered 304 Not Modified
+        #
+        self.fetch = fetch
+        self.ttl = dict(CACHE_TTL, **(ttl or {}))
+        self.stale = stale
+        self.lastError = None
+        self._entries = {}
+        self._versions = 0
+        self._lock = threading.Lock()
+
+
+    def get(self, url, endpoint):
+        return self.getVersioned(url, endpoint)[0]
+
+
+    def getVersioned(self, url, endpoint):
+        #
+        # (value, version), both from the same entry
+        #
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and time.time() - entry.fetched < self.ttl.get(endpoint, 0):
+                return entry.value, entry.version
+            background = entry is not None and self.stale
+            if background:
+                if not entry.revalidating:
+                    entry.revalidating = True
+                    threading.Thread(target=self._revalidateQuietly, args=(url, entry), daemon=True).start()
+                return entry.value, entry.version
+        entry = self._revalidate(url, entry)
+        return entry.value, entry.version
+
+
+    def _revalidate(self, url, entry):
+        try:
+            result = self.fetch(url, entry)
+        finally:
+            if entry is not None:
+                entry.revalidating = False
+        with self._lock:
+            if result is None:
+                entry.fetched = time.time()
+                return entry
+            value, etag, lastModified = result
+            new = CacheEntry(value, etag, lastModified)
+            self._versions += 1
+            new.version = self._versions
+            self._entries[url] = new
+            return new
+
+
+    def _revalidateQuietly(self, url, entry):
+        #
+        # The stale answer stays in place if the api cannot be reached
+        #
+        try:
+            self._revalidate(url, entry)
+        except Exception as e:
+            self.lastError = e
+
+
+    def version(self, url):
+        entry = self._entries.get(url)
+        return None if entry is None else entry.version
+
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
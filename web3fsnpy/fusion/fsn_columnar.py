@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+"""
+    Columnar (struct of arrays) tables of api rows. NumPy and pandas are optional; without
+    NumPy the columns are plain lists.
+"""
+#
+#
+import json
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+from .fsn_utils import (
+    to_integer,
+)
+from .fsn_api import (
+    LazySwap,
+    SWAP_ROW_FIELDS,
+    SWAP_DATA_FIELDS,
+)
+
+
+SWAP_INT_FIELDS = ['height', 'size', 'SwapSize']
+
+SWAP_TIME_FIELDS = ['timeStamp', 'FromStartTime', 'ToEndTime', 'Time']      # Seconds since 1970, 0xffffffffffffffff is forever
+
+SWAP_AMOUNT_FIELDS = ['MinFromAmount', 'MinToAmount']                      # Wei, larger than 64 bits
+
+
+def _asInt(value):
+    if isinstance(value, (list, tuple)):
+        return [_asInt(v) for v in value]
+    return 0 if value is None else to_integer(value)
+
+
+def _asInts(values):
+    #
+    # The api normally sends numbers, but hex or decimal strings are accepted too. The times and amounts
+    # of multi swaps are lists, which become lists of ints
+    #
+    if any(not isinstance(v, int) for v in values):
+        return [_asInt(v) for v in values]
+    return values
+
+
+def _hasLists(values):
+    return any(isinstance(v, list) for v in values)
+
+
+def swapsToColumns(rows, exact_amounts=False):
+    #
+    # rows are raw swap rows from the api (with a JSON 'data' field) or LazySwap objects.
+    # Each row's 'data' is decoded exactly once, then every numeric column is converted in one pass.
+    #
+    columns = {key: [] for key in SWAP_ROW_FIELDS + SWAP_DATA_FIELDS}
+    rowAppends = [(key, columns[key].append) for key in SWAP_ROW_FIELDS]
+    dataAppends = [(key, columns[key].append) for key in SWAP_DATA_FIELDS]
+
+    for row in rows:
+        if isinstance(row, LazySwap):
+            raw = row.raw
+            data = row.data
+        else:
+            raw = row
+            data = raw['data']
+            if isinstance(data, str):
+                data = json.loads(data)
+        for key, append in rowAppends:
+            append(raw.get(key))
+        for key, append in dataAppends:
+            append(data.get(key))
+
+    for key in SWAP_INT_FIELDS + SWAP_TIME_FIELDS + SWAP_AMOUNT_FIELDS:
+        columns[key] = _asInts(columns[key])
+
+    if np is None:
+        return columns
+
+    #
+    # A column holding the lists of a multi swap stays an object column
+    #
+    for key in SWAP_INT_FIELDS:
+        if not _hasLists(columns[key]):
+            columns[key] = np.array(columns[key], dtype=np.int64)
+    for key in SWAP_TIME_FIELDS:
+        if not _hasLists(columns[key]):
+            columns[key] = np.array(columns[key], dtype=np.uint64)
+    for key in SWAP_AMOUNT_FIELDS:
+        if not _hasLists(columns[key]):
+            columns[key] = np.array(columns[key], dtype=object if exact_amounts else np.float64)
+    for key in columns:
+        if not isinstance(columns[key], np.ndarray):
+            array = np.empty(len(columns[key]), dtype=object)
+            array[:] = columns[key]
+            columns[key] = array
+
+    return columns
+
+
+def columnsToFrame(columns):
+    if pd is None:
+        raise ImportError('pandas is required for a DataFrame, use the struct of arrays output instead')
+    return pd.DataFrame(columns)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#
+"""
+    Concurrent crawler for the transaction history pages of Fusion's api
+"""
+#
+#
+import os
+import json
+import itertools
+import threading
+
+
+TX_PAGE_SIZE = 100
+
+
+def saveCheckpoint(path, state):
+    #
+    # Write to a temporary file and rename, so an interrupted write never leaves a broken checkpoint
+    #
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def loadCheckpoint(path):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _rows(page):
+    return [row for row in page if isinstance(row, dict)]
+
+
+def _topHash(rows):
+    return rows[0].get('hash') if rows else None
+
+
+def iterContiguousPages(api, fetchPage, page_size=TX_PAGE_SIZE, prefetch=2, startPage=0, endPage=None, workers=None):
+    #
+    # As api.iterPageResults for pages sorted by descending height, but without gaps. New transactions
+    # push rows onto the following pages, so a page fetched before the one above it can miss the rows
+    # pushed across the boundary. That can only happen if the head moved while the two were fetched.
+    #
+    # Each fetch is stamped with a counter when it starts and ends, and the hash at the top of page 0
+    # is probed before the crawl. When a page neither overlaps the page delivered before it nor is known
+    # to have been fetched after it, page 0 is probed again, unless a probe made since both fetches ended
+    # can be reused. Only if the top hash changed between a probe before both fetches and one after
+    # them is the page fetched again, which puts it after the page above.
+    #
+    lock = threading.Lock()
+    clock = [0]
+    stamps = {}                 # pageNo: (start, end) of its latest fetch
+    probes = []                 # (start, end, top hash of page 0)
+
+    def tick():
+        with lock:
+            clock[0] += 1
+            return clock[0]
+
+    def fetch(pageNo):
+        start = tick()
+        rows = _rows(fetchPage(pageNo))
+        stamps[pageNo] = (start, tick())
+        return rows
+
+    def probe():
+        start = tick()
+        top = _topHash(_rows(fetchPage(0)))
+        probes.append((start, tick(), top))
+
+    def headMoved(first, second):
+        started = min(stamps[first][0], stamps[second][0])
+        ended = max(stamps[first][1], stamps[second][1])
+        if probes[-1][0] < ended:
+            probe()
+        before = [top for start, end, top in probes if end < started]
+        return not before or before[-1] != probes[-1][2]
+
+    probe()
+    previous = None
+    pageNo = startPage - 1
+    pages = api.iterPageResults(fetch, page_size, prefetch, startPage, endPage, workers)
+    try:
+        while True:
+            #
+            # Pages are checked 'prefetch' at a time, so one probe after they have all arrived covers them
+            #
+            chunk = list(itertools.islice(pages, max(1, prefetch)))
+            if not chunk:
+                break
+            for pageNo, rows in chunk:
+                if previous is not None and not (rows and rows[0].get('hash') in previous) \
+                        and stamps[pageNo][0] < stamps[pageNo - 1][1] and headMoved(pageNo - 1, pageNo):
+                    rows = fetch(pageNo)
+                previous = set(row.get('hash') for row in rows)
+                yield pageNo, rows
+                if len(rows) < page_size:
+                    return
+    finally:
+        pages.close()
+    #
+    # The last page was fetched again and has filled up since, so carry on one page at a time
+    #
+    if pageNo < startPage or len(rows) < page_size:
+        return
+    while endPage is None or pageNo + 1 < endPage:
+        pageNo += 1
+        rows = fetch(pageNo)
+        yield pageNo, rows
+        if len(rows) < page_size:
+            return
+
+
+class TransactionCrawler:
+    """
+    Walks a range of 'transactions/all' pages (most recent first) with several concurrent workers
+    sharing the api's pooled session, and yields the transactions in page order.
+
+    While the crawl runs the chain keeps growing, which pushes rows already seen onto the following
+    page. Pages come from iterContiguousPages, which fetches a page again if the head moved while it
+    and the page above were fetched, and rows are de-duplicated on their height: as the pages are sorted
+    by descending height, a row is new if it is below the last delivered height, or at that height with
+    an unseen hash.
+
+    If a checkpoint file is given, the position is saved after each page has been consumed and
+    crawl(resume=True) carries on from there.
+    """
+
+    def __init__(self, api, workers=8, checkpoint=None, noTickets=False, prefetch=None):
+        self.api = api
+        self.workers = workers
+        self.prefetch = 2*workers if prefetch is None else prefetch
+        self.checkpoint = checkpoint
+        self.noTickets = noTickets
+
+
+    def _fetch(self, pageNo):
+        if self.noTickets:
+            return self.api.transactionNoTicketsDesc(pageNo)
+        return self.api.transactionsDesc(pageNo)
+
+
+    def crawl(self, startPage=0, endPage=None, resume=False):
+        lastHeight = None
+        seenAtHeight = set()
+
+        if resume:
+            state = loadCheckpoint(self.checkpoint)
+            if state is not None:
+                startPage = state['nextPage']
+                if endPage is None:
+                    endPage = state['endPage']
+                lastHeight = state['lastHeight']
+                seenAtHeight = set(state['seenAtHeight'])
+
+        pages = iterContiguousPages(
+            self.api, self._fetch, TX_PAGE_SIZE, self.prefetch, startPage, endPage, self.workers
+        )
+        for pageNo, rows in pages:
+            for tx in rows:
+                height = int(tx['height'])
+                if lastHeight is not None:
+                    if height > lastHeight:
+                        continue
+                    if height == lastHeight and tx['hash'] in seenAtHeight:
+                        continue
+                if height != lastHeight:
+                    lastHeight = height
+                    seenAtHeight = set()
+                seenAtHeight.add(tx['hash'])
+                yield tx
+
+            if self.checkpoint is not None:
+                saveCheckpoint(self.checkpoint, {
+                    'nextPage':     pageNo + 1,
+                    'endPage':      endPage,
+                    'lastHeight':   lastHeight,
+                    'seenAtHeight': sorted(seenAtHeight),
+                })
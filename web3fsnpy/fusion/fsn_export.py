@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+#
+"""
+    Streaming export of swaps, tickets and block events to Parquet (needs pyarrow) or CSV files.
+    Rows are buffered as columns and written out one row group at a time, so memory use does not
+    depend on the number of rows exported.
+"""
+#
+#
+import os
+import csv
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from .fsn_utils import (
+    to_integer,
+)
+from .fsn_api import (
+    LazySwap,
+    SWAP_ROW_FIELDS,
+    SWAP_DATA_FIELDS,
+)
+from .fsn_ingest import (
+    Block,
+)
+
+
+ROW_GROUP_SIZE = 50000
+
+
+#
+# Column types. Times are uint because 0xffffffffffffffff means forever. Amounts in Wei do not fit
+# in 64 bits, so they are written as decimal strings. Lists and dicts are written as JSON. The start
+# and end times of a swap are lists for multi swaps, so like amounts they are written as decimal
+# strings, or JSON lists of them.
+#
+SWAP_FIELD_TYPES = {
+    'timeStamp': 'uint', 'height': 'int', 'size': 'int', 'FromStartTime': 'times', 'ToEndTime': 'times',
+    'MinFromAmount': 'amount', 'MinToAmount': 'amount', 'SwapSize': 'int', 'Targes': 'json', 'Time': 'uint',
+}
+
+SWAP_EXPORT_FIELDS = [(key, SWAP_FIELD_TYPES.get(key, 'str')) for key in SWAP_ROW_FIELDS + SWAP_DATA_FIELDS]
+
+TICKET_EXPORT_FIELDS = [
+    ('id', 'str'), ('owner', 'str'), ('height', 'int'), ('startTime', 'uint'), ('expireTime', 'uint'), ('block', 'int'),
+]
+
+EVENT_FIELD_TYPES = {
+    'number': 'int', 'blockNumber': 'int', 'timestamp': 'uint', 'txIndex': 'int', 'txCount': 'int', 'status': 'int',
+    'decimals': 'int', 'swapSize': 'int', 'size': 'int', 'startTime': 'uint', 'endTime': 'uint',
+    'value': 'amount', 'total': 'amount', 'minFromAmount': 'amount', 'minToAmount': 'amount',
+    'isInc': 'bool', 'canChange': 'bool', 'multi': 'bool', 'data': 'json', 'targes': 'json',
+}
+
+
+def _toAmount(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return json.dumps([_toAmount(v) for v in value])
+    return str(to_integer(value))
+
+
+def _toStr(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return json.dumps(value)
+
+
+def _toJson(value):
+    return None if value is None else json.dumps(value, default=str)
+
+
+def _toBool(value):
+    return None if value is None else bool(value)
+
+
+CONVERTERS = {
+    'int':      to_integer,
+    'uint':     to_integer,
+    'times':    _toAmount,
+    'amount':   _toAmount,
+    'str':      _toStr,
+    'json':     _toJson,
+    'bool':     _toBool,
+}
+
+
+def _arrowType(kind):
+    return {
+        'int':      pa.int64(),
+        'uint':     pa.uint64(),
+        'bool':     pa.bool_(),
+    }.get(kind, pa.string())
+
+
+def exportFormat(path, format=None):
+    if format is None:
+        format = 'parquet' if path.endswith('.parquet') else 'csv'
+    if format not in ('parquet', 'csv'):
+        raise ValueError('Error in export: format must be parquet or csv, not ', format)
+    if format == 'parquet' and pa is None:
+        raise ImportError('pyarrow is required to write Parquet, use format=\'csv\' instead')
+    return format
+
+
+class RecordWriter:
+    """
+    Writes rows with a fixed list of (name, type) fields to one Parquet or CSV file. Rows are kept as
+    columns until row_group_size of them have been written, then converted and written as one row group
+    (for CSV, as one block of lines). Use as a context manager, or call close().
+    """
+
+    def __init__(self, path, fields, format=None, row_group_size=ROW_GROUP_SIZE, compression='snappy'):
+        self.path = path
+        self.format = exportFormat(path, format)
+        self.fields = list(fields)
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._columns = [[] for field in self.fields]
+        self._converters = [CONVERTERS[kind] for name, kind in self.fields]
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if self.format == 'parquet':
+            self._schema = pa.schema([(name, _arrowType(kind)) for name, kind in self.fields])
+            self._writer = pq.ParquetWriter(path, self._schema, compression=compression)
+        else:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([name for name, kind in self.fields])
+
+
+    def writeRow(self, values):
+        #
+        # values in the order of the fields
+        #
+        for column, convert, value in zip(self._columns, self._converters, values):
+            column.append(convert(value))
+        self.rows += 1
+        if len(self._columns[0]) >= self.row_group_size:
+            self._writeGroup()
+
+
+    def write(self, record):
+        #
+        # record is a mapping or a namedtuple with the field names. Missing fields are written as null
+        #
+        if hasattr(record, '_asdict'):
+            record = record._asdict()
+        get = record.get
+        self.writeRow([get(name) for name, kind in self.fields])
+
+
+    def _writeGroup(self):
+        if not self._columns[0]:
+            return
+        if self.format == 'parquet':
+            arrays = [pa.array(column, type=field.type) for column, field in zip(self._columns, self._schema)]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        else:
+            self._writer.writerows(zip(*self._columns))
+        self._columns = [[] for field in self.fields]
+
+
+    def flush(self):
+        #
+        # Write the rows held so far. For Parquet this makes a short row group, so it is not called per batch
+        #
+        self._writeGroup()
+        if self.format == 'csv':
+            self._file.flush()
+
+
+    def close(self):
+        self._writeGroup()
+        if self.format == 'parquet':
+            self._writer.close()
+        else:
+            self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def eventFields(eventType):
+    return [(name, EVENT_FIELD_TYPES.get(name, 'str')) for name in eventType._fields]
+
+
+class EventExporter:
+    """
+    Sink for BlockIngester (or BlockFollower) that writes each kind of event to its own file in
+    'directory', named after the event type, e.g. Block.parquet, TakeSwap.parquet. The files are
+    opened when the first event of their kind arrives. The format is Parquet if pyarrow is installed,
+    otherwise CSV, unless one is given.
+    """
+
+    def __init__(self, directory, format=None, row_group_size=ROW_GROUP_SIZE, kinds=None):
+        self.directory = directory
+        if format is None:
+            format = 'csv' if pa is None else 'parquet'
+        self.format = exportFormat('', format)
+        self.row_group_size = row_group_size
+        self.kinds = None if kinds is None else set(kinds)
+        self.writers = {}
+        self.lastBlock = None
+
+
+    def _writer(self, eventType):
+        writer = self.writers.get(eventType)
+        if writer is None:
+            path = os.path.join(self.directory, '{}.{}'.format(eventType.__name__, self.format))
+            writer = RecordWriter(path, eventFields(eventType), self.format, self.row_group_size)
+            self.writers[eventType] = writer
+        return writer
+
+
+    def apply(self, event):
+        eventType = type(event)
+        if isinstance(event, Block):
+            self.lastBlock = event.number
+        if self.kinds is not None and eventType.__name__ not in self.kinds:
+            return
+        self._writer(eventType).writeRow(event)
+
+    __call__ = apply
+
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def swapRow(row):
+    #
+    # Values of one api swap row (raw dict or LazySwap) in the order of SWAP_EXPORT_FIELDS
+    #
+    if isinstance(row, LazySwap):
+        raw = row.raw
+        data = row.data
+    else:
+        raw = row
+        data = raw.get('data') or {}
+        if isinstance(data, str):
+            data = json.loads(data)
+    return [raw.get(key) for key in SWAP_ROW_FIELDS] + [data.get(key) for key in SWAP_DATA_FIELDS]
+
+
+def exportSwaps(rows, path, format=None, row_group_size=ROW_GROUP_SIZE):
+    #
+    # rows is any iterable of swap rows, e.g. fsnapi.iterSwaps(). Returns the number of rows written
+    #
+    with RecordWriter(path, SWAP_EXPORT_FIELDS, format, row_group_size) as writer:
+        for row in rows:
+            if isinstance(row, (dict, LazySwap)):
+                writer.writeRow(swapRow(row))
+    return writer.rows
+
+
+def exportTickets(tickets, path, block=None, format=None, row_group_size=ROW_GROUP_SIZE):
+    #
+    # tickets is the dict returned by allTickets, {ticketId: {Owner, Height, StartTime, ExpireTime}}
+    #
+    with RecordWriter(path, TICKET_EXPORT_FIELDS, format, row_group_size) as writer:
+        for ticketId, info in dict(tickets).items():
+            writer.writeRow([ticketId, info['Owner'], info.get('Height'), info.get('StartTime'),
+                             info.get('ExpireTime'), block])
+    return writer.rows
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#
+"""
+    Reorg safe chain following. Feeds the events of new blocks to consumers, rolls them back
+    when the chain reorganises, and keeps a checkpoint on disk to resume from.
+"""
+#
+#
+import threading
+from collections import (
+    deque,
+)
+
+from .fsn_utils import (
+    to_integer,
+    to_hex_if_bytes,
+)
+from .fsn_ingest import (
+    Block,
+    BlockIngester,
+    BatchRpc,
+)
+from .fsn_crawler import (
+    saveCheckpoint,
+    loadCheckpoint,
+)
+from .exceptions import (
+    ReorgTooDeep,
+)
+
+
+class BlockFollower:
+    """
+    Follows the head of the chain, passing the events of every new block (see BlockIngester) to each
+    consumer in block order. A consumer is a callable; it may also have flush(), called after each batch,
+    and rollback(height), called when the blocks above height have been replaced by a reorganisation.
+
+    The hashes of the last 'depth' blocks are kept in a ring buffer. When a new block's parentHash does
+    not match, the buffer is compared with the chain to find the fork point, the consumers are rolled
+    back to it and the new blocks are delivered. After each batch (height, hash) and the ring buffer are
+    saved to the checkpoint file, so a restart carries on where it stopped.
+    """
+
+    def __init__(self, fsn, consumers=(), checkpoint=None, depth=64, confirmations=0,
+                 poll_interval=2, batch_size=20, workers=4):
+        self.fsn = fsn
+        self.consumers = list(consumers)
+        self.checkpoint = checkpoint
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.ingester = BlockIngester(fsn, None, batch_size, workers)
+        self.rpc = BatchRpc(fsn.web3)
+        self.recent = deque(maxlen=depth)       # (height, hash) of the last blocks delivered
+        self._stop = threading.Event()
+
+        state = loadCheckpoint(checkpoint)
+        if state is not None:
+            self.recent.extend((height, blockHash) for height, blockHash in state['recent'])
+
+
+    @property
+    def height(self):
+        return self.recent[-1][0] if self.recent else None
+
+
+    def addConsumer(self, consumer):
+        self.consumers.append(consumer)
+
+
+    def _save(self):
+        if self.checkpoint is not None and self.recent:
+            height, blockHash = self.recent[-1]
+            saveCheckpoint(self.checkpoint, {'height': height, 'hash': blockHash, 'recent': list(self.recent)})
+
+
+    def _canonicalHashes(self, heights):
+        blocks = self.rpc.call([('eth_getBlockByNumber', [hex(h), False]) for h in heights])
+        return {h: None if block is None else to_hex_if_bytes(block['hash']) for h, block in zip(heights, blocks)}
+
+
+    def _rollback(self):
+        #
+        # Find the highest remembered block that is still on the chain and roll everything back to it
+        #
+        canonical = self._canonicalHashes([height for height, blockHash in self.recent])
+        while self.recent and canonical.get(self.recent[-1][0]) != self.recent[-1][1]:
+            self.recent.pop()
+        if not self.recent:
+            raise ReorgTooDeep('Error in BlockFollower: the chain reorganised below the oldest remembered block ',
+                               min(canonical) if canonical else None)
+        forkHeight = self.recent[-1][0]
+        for consumer in self.consumers:
+            rollback = getattr(consumer, 'rollback', None)
+            if rollback is not None:
+                rollback(forkHeight)
+        self._save()
+        return forkHeight
+
+
+    def step(self, startBlock=None):
+        #
+        # Deliver the blocks from the last one delivered (or startBlock) up to the head less confirmations.
+        # Returns the height reached
+        #
+        while not self._follow(startBlock):
+            pass
+        return self.height
+
+
+    def _follow(self, startBlock):
+        #
+        # Returns False if it stopped at a reorganisation, after rolling back
+        #
+        head = to_integer(self.fsn.web3.manager.request_blocking('eth_blockNumber', [])) - self.confirmations
+        if self.recent:
+            start = self.recent[-1][0] + 1
+        else:
+            start = head if startBlock is None else startBlock
+        if start > head:
+            return True
+
+        batches = self.ingester.iterBatches(start, head)
+        try:
+            for events in batches:
+                for ii, event in enumerate(events):
+                    if isinstance(event, Block):
+                        if self.recent and (event.number != self.recent[-1][0] + 1 or
+                                            event.parentHash != self.recent[-1][1]):
+                            #
+                            # Deliver the batch up to here, then roll back to the fork and start again above it
+                            #
+                            self._deliver(events[:ii])
+                            self._rollback()
+                            return False
+                        self.recent.append((event.number, event.hash))
+                self._deliver(events)
+                self._save()
+        finally:
+            batches.close()
+        return True
+
+
+    def _deliver(self, events):
+        for consumer in self.consumers:
+            for event in events:
+                consumer(event)
+            flush = getattr(consumer, 'flush', None)
+            if flush is not None:
+                flush()
+
+
+    def run(self, startBlock=None):
+        #
+        # Follow the chain until stop() is called
+        #
+        self._stop.clear()
+        while not self._stop.is_set():
+            self.step(startBlock)
+            self._stop.wait(self.poll_interval)
+
+
+    def stop(self):
+        self._stop.set()
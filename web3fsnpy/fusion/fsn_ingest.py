@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+#
+"""
+    Block ingestion. Reads ranges of blocks from the chain, decodes the Fusion operations in them
+    and hands them to a sink as typed events, in block order.
+"""
+#
+#
+import json
+import itertools
+import threading
+from collections import (
+    namedtuple,
+    deque,
+)
+from concurrent.futures import ThreadPoolExecutor
+
+from web3 import HTTPProvider
+from web3._utils.request import (
+    make_post_request,
+)
+
+from .fsn_utils import (
+    to_integer,
+    to_hex_if_bytes,
+)
+
+
+EVENT_FIELDS = ['blockNumber', 'timestamp', 'txIndex', 'txHash', 'sender', 'status', 'data']
+
+
+def _event(name, fields):
+    return namedtuple(name, EVENT_FIELDS + fields)
+
+
+Block = namedtuple('Block', ['number', 'hash', 'parentHash', 'timestamp', 'miner', 'txCount'])
+
+GenAsset = _event('GenAsset', ['assetId', 'name', 'symbol', 'decimals', 'total', 'canChange'])
+AssetValueChange = _event('AssetValueChange', ['assetId', 'to', 'value', 'isInc'])
+SendAsset = _event('SendAsset', ['assetId', 'to', 'value'])
+TimeLock = _event('TimeLock', ['assetId', 'to', 'value', 'startTime', 'endTime', 'lockType'])
+MakeSwap = _event('MakeSwap', ['swapId', 'fromAssetId', 'toAssetId', 'minFromAmount', 'minToAmount', 'swapSize', 'targes', 'multi'])
+TakeSwap = _event('TakeSwap', ['swapId', 'size', 'multi'])
+RecallSwap = _event('RecallSwap', ['swapId', 'multi'])
+BuyTicket = _event('BuyTicket', ['startTime', 'endTime'])
+GenNotation = _event('GenNotation', [])
+FusionCall = _event('FusionCall', ['topic'])        # Any other Fusion call
+
+
+def _decode(topic, base, data):
+    get = data.get
+    if topic == 'GenAssetFunc':
+        return GenAsset(*base, get('AssetID'), get('Name'), get('Symbol'), to_integer(get('Decimals')),
+                        to_integer(get('Total')), get('CanChange'))
+    if topic in ('AssetValueChangeFunc', 'AssetValueChangeExFunc'):
+        return AssetValueChange(*base, get('AssetID'), get('To'), to_integer(get('Value')), get('IsInc'))
+    if topic == 'SendAssetFunc':
+        return SendAsset(*base, get('AssetID'), get('To'), to_integer(get('Value')))
+    if topic == 'TimeLockFunc':
+        return TimeLock(*base, get('AssetID'), get('To'), to_integer(get('Value')), to_integer(get('StartTime')),
+                        to_integer(get('EndTime')), get('LockType'))
+    if topic in ('MakeSwapFunc', 'MakeSwapFuncExt', 'MakeMultiSwapFunc'):
+        return MakeSwap(*base, get('SwapID'), get('FromAssetID'), get('ToAssetID'), get('MinFromAmount'),
+                        get('MinToAmount'), to_integer(get('SwapSize')), get('Targes'), topic == 'MakeMultiSwapFunc')
+    if topic in ('TakeSwapFunc', 'TakeSwapFuncExt', 'TakeMultiSwapFunc'):
+        return TakeSwap(*base, get('SwapID'), to_integer(get('Size')), topic == 'TakeMultiSwapFunc')
+    if topic in ('RecallSwapFunc', 'RecallMultiSwapFunc'):
+        return RecallSwap(*base, get('SwapID'), topic == 'RecallMultiSwapFunc')
+    if topic == 'BuyTicketFunc':
+        return BuyTicket(*base, to_integer(get('StartTime')), to_integer(get('EndTime')))
+    if topic == 'GenNotationFunc':
+        return GenNotation(*base)
+    return FusionCall(*base, topic)
+
+
+def decodeFusionTx(block, tx, txAndReceipt):
+    #
+    # Turn one fsn_getTransactionAndReceipt result into an event. The decoded parameters of the call
+    # (fsnTxInput) are completed by the data that the node logged for it (fsnLogData)
+    #
+    txInput = txAndReceipt.get('fsnTxInput') or {}
+    data = dict(txInput.get('FuncParam') or {})
+    logData = txAndReceipt.get('fsnLogData')
+    if isinstance(logData, str):
+        try:
+            logData = json.loads(logData)
+        except ValueError:
+            logData = None
+    if isinstance(logData, dict):
+        data.update(logData)
+    topic = txAndReceipt.get('fsnLogTopic') or txInput.get('FuncType')
+
+    receipt = txAndReceipt.get('receipt') or {}
+    base = (
+        to_integer(block['number']), to_integer(block['timestamp']), to_integer(tx['transactionIndex']),
+        to_hex_if_bytes(tx['hash']), tx['from'], to_integer(receipt.get('status')), data,
+    )
+    return _decode(topic, base, data)
+
+
+class BatchRpc:
+    """
+    Sends several JSON-RPC calls at once. Over HTTP they go as one batch request on web3's
+    kept-alive session. Other providers share one connection, so the calls are made one after the other.
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+
+    def call(self, calls):
+        #
+        # calls is a list of (method, params). Returns the list of results, in the same order
+        #
+        if not calls:
+            return []
+        provider = self.web3.provider
+        if isinstance(provider, HTTPProvider):
+            return self._httpBatch(provider, calls)
+        with self._lock:
+            return [self.web3.manager.request_blocking(method, params) for method, params in calls]
+
+
+    def _httpBatch(self, provider, calls):
+        ids = [next(self._ids) for call in calls]
+        payload = [
+            {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': callId}
+            for callId, (method, params) in zip(ids, calls)
+        ]
+        raw = make_post_request(
+            provider.endpoint_uri, json.dumps(payload).encode('utf-8'), **provider.get_request_kwargs()
+        )
+        replies = json.loads(raw.decode('utf-8'))
+        if isinstance(replies, dict):
+            raise ValueError('Error in BatchRpc: the node rejected the batch ', replies.get('error', replies))
+        byId = {reply.get('id'): reply for reply in replies}
+        results = []
+        for callId, (method, params) in zip(ids, calls):
+            reply = byId.get(callId)
+            if reply is None or 'error' in reply:
+                raise ValueError('Error in BatchRpc: ', method, params, None if reply is None else reply['error'])
+            results.append(reply['result'])
+        return results
+
+
+class BlockIngester:
+    """
+    Fetches blocks [start, end] with full transactions in batches of batch_size blocks on 'workers'
+    threads, enriches every call to the Fusion call address with fsn_getTransactionAndReceipt and
+    passes a Block event followed by the block's Fusion events to sink(event), strictly in block order.
+
+    If the sink has a flush() method it is called after each batch of blocks has been delivered.
+    Calls that failed on chain are only passed on with include_failed=True.
+    """
+
+    def __init__(self, fsn, sink=None, batch_size=20, workers=4, include_failed=False):
+        self.fsn = fsn
+        self.sink = sink
+        self.batch_size = batch_size
+        self.workers = workers
+        self.include_failed = include_failed
+        self.rpc = BatchRpc(fsn.web3)
+        self.lastBlock = None
+
+
+    def fetchBlocks(self, numbers):
+        blocks = self.rpc.call([('eth_getBlockByNumber', [hex(n), True]) for n in numbers])
+
+        callAddress = self.fsn.consts['FSNCallAddress'].lower()
+        fusionTxs = []
+        for block in blocks:
+            if block is None:
+                raise ValueError('Error in BlockIngester: block not found ', numbers)
+            for tx in block['transactions']:
+                if tx.get('to') is not None and tx['to'].lower() == callAddress:
+                    fusionTxs.append((block, tx))
+
+        details = self.rpc.call([
+            ('fsn_getTransactionAndReceipt', [to_hex_if_bytes(tx['hash'])]) for block, tx in fusionTxs
+        ])
+
+        events = []
+        detailsIter = iter(zip(fusionTxs, details))
+        pendingTx = next(detailsIter, None)
+        for block in blocks:
+            events.append(Block(
+                to_integer(block['number']), to_hex_if_bytes(block['hash']), to_hex_if_bytes(block['parentHash']),
+                to_integer(block['timestamp']), block.get('miner'), len(block['transactions']),
+            ))
+            while pendingTx is not None and pendingTx[0][0] is block:
+                (b, tx), txAndReceipt = pendingTx
+                event = decodeFusionTx(block, tx, dict(txAndReceipt))
+                if self.include_failed or event.status != 0:
+                    events.append(event)
+                pendingTx = next(detailsIter, None)
+        return events
+
+
+    def iterBatches(self, start, end=None):
+        #
+        # Generator of the events of blocks start to end inclusive, one list per batch of blocks.
+        # end defaults to the latest block
+        #
+        if end is None:
+            end = to_integer(self.fsn.web3.manager.request_blocking('eth_blockNumber', []))
+        batches = (range(b, min(b + self.batch_size, end + 1)) for b in range(start, end + 1, self.batch_size))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            for numbers in itertools.islice(batches, 2*self.workers):
+                pending.append((numbers, executor.submit(self.fetchBlocks, numbers)))
+            while pending:
+                numbers, future = pending.popleft()
+                events = future.result()
+                for nextNumbers in itertools.islice(batches, 1):
+                    pending.append((nextNumbers, executor.submit(self.fetchBlocks, nextNumbers)))
+                yield events
+                self.lastBlock = numbers[-1]
+        finally:
+            for numbers, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+    def iterEvents(self, start, end=None):
+        for events in self.iterBatches(start, end):
+            yield from events
+
+
+    def run(self, start, end=None):
+        #
+        # Pass every event to the sink. Returns the number of the last block delivered
+        #
+        if self.sink is None:
+            raise TypeError('Error in BlockIngester: no sink was given')
+        flush = getattr(self.sink, 'flush', None)
+        for events in self.iterBatches(start, end):
+            for event in events:
+                self.sink(event)
+            if flush is not None:
+                flush()
+        return self.lastBlock
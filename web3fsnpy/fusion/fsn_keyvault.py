@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+#
+"""
+    A vault of private keys unlocked from a directory of V3 keyfiles. The scrypt or pbkdf2 key
+    derivation of each keyfile runs once, on a process pool, and the decrypted keys are held in
+    memory until their time to live runs out or they are locked, when they are overwritten with zeros.
+"""
+#
+#
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ..eth_account import (
+    Account,
+)
+from eth_utils import (
+    to_checksum_address,
+)
+
+from .exceptions import (
+    AccountLocked,
+)
+
+
+DEFAULT_TTL = 900
+
+
+def isKeyfile(keyfile):
+    return isinstance(keyfile, dict) and keyfile.get('version') == 3 and ('crypto' in keyfile or 'Crypto' in keyfile)
+
+
+def readKeyfiles(directory):
+    #
+    # [(path, keyfile dict)] of the V3 keyfiles in directory, e.g. a geth keystore. Other files are skipped
+    #
+    keyfiles = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        try:
+            with open(path) as f:
+                keyfile = json.load(f)
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if isKeyfile(keyfile):
+            keyfiles.append((path, keyfile))
+    return keyfiles
+
+
+def _decrypt(keyfile, password):
+    #
+    # Runs in the pool. The key comes back as bytes, and the vault copies it into a bytearray
+    #
+    return bytes(Account.decrypt(keyfile, password))
+
+
+class KeyVault:
+    """
+    Holds decrypted private keys by checksum address. Each key expires ttl seconds after it is
+    unlocked (None for never). account(address) gives a LocalAccount for an unlocked key, and
+    lock() overwrites the keys with zeros. Use as a context manager to lock everything on exit.
+
+    The vault's copy of each key is a bytearray, which is zeroed in place. The bytes passed back by
+    the decrypting process and the key inside a LocalAccount are immutable Python objects that cannot
+    be zeroed, so LocalAccounts should not be kept longer than they are needed.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, workers=4):
+        self.ttl = ttl
+        self.workers = workers
+        self.failed = {}            # path: error of the keyfiles that could not be unlocked
+        self._keys = {}             # address: (bytearray key, expiry time.monotonic(), or None)
+
+
+    def _password(self, passwords, path, keyfile):
+        #
+        # passwords is one password for all keyfiles, a dict by address or file name, or a function (path, keyfile)
+        #
+        if callable(passwords):
+            return passwords(path, keyfile)
+        if isinstance(passwords, dict):
+            address = keyfile.get('address', '')
+            for key in (address, '0x' + address, os.path.basename(path)):
+                if key in passwords:
+                    return passwords[key]
+            for key, password in passwords.items():
+                if key.lower() in (address.lower(), '0x' + address.lower()):
+                    return password
+            return None
+        return passwords
+
+
+    def unlock(self, keystore, passwords):
+        #
+        # keystore is a directory, or a list of keyfile paths or dicts. Keyfiles without a password are
+        # skipped. Returns the addresses unlocked. Those that fail (e.g. a wrong password) are in self.failed
+        #
+        if isinstance(keystore, str):
+            keyfiles = readKeyfiles(keystore)
+        else:
+            keyfiles = []
+            for keyfile in keystore:
+                if isinstance(keyfile, dict):
+                    keyfiles.append((None, keyfile))
+                else:
+                    with open(keyfile) as f:
+                        keyfiles.append((keyfile, json.load(f)))
+
+        jobs = []
+        for path, keyfile in keyfiles:
+            password = self._password(passwords, path, keyfile)
+            if password is not None:
+                jobs.append((path, keyfile, password))
+
+        if self.workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as executor:
+                futures = [executor.submit(_decrypt, keyfile, password) for path, keyfile, password in jobs]
+                results = []
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        results.append(e)
+        else:
+            results = []
+            for path, keyfile, password in jobs:
+                try:
+                    results.append(_decrypt(keyfile, password))
+                except Exception as e:
+                    results.append(e)
+
+        unlocked = []
+        for (path, keyfile, password), result in zip(jobs, results):
+            name = path or keyfile.get('address')
+            if isinstance(result, Exception):
+                self.failed[name] = str(result)
+                continue
+            self.failed.pop(name, None)
+            unlocked.append(self.add(result))
+        return unlocked
+
+
+    def add(self, private_key, ttl='default'):
+        #
+        # Adds a decrypted key (bytes or hex string), returning its address
+        #
+        if isinstance(private_key, str):
+            private_key = bytes.fromhex(private_key[2:] if private_key[:2] in ('0x', '0X') else private_key)
+        key = bytearray(private_key)
+        address = Account.from_key(bytes(key)).address
+        if ttl == 'default':
+            ttl = self.ttl
+        self.lock(address)
+        self._keys[address] = (key, None if ttl is None else time.monotonic() + ttl)
+        return address
+
+
+    def _key(self, address):
+        address = to_checksum_address(address)
+        entry = self._keys.get(address)
+        if entry is None:
+            raise AccountLocked('Error in KeyVault: no key is unlocked for ', address)
+        key, expiry = entry
+        if expiry is not None and time.monotonic() >= expiry:
+            self.lock(address)
+            raise AccountLocked('Error in KeyVault: the key has expired for ', address)
+        return key
+
+
+    def account(self, address):
+        return Account.from_key(bytes(self._key(address)))
+
+
+    def extend(self, address, ttl='default'):
+        #
+        # Restarts the time to live of an unlocked key
+        #
+        key = self._key(address)
+        if ttl == 'default':
+            ttl = self.ttl
+        self._keys[to_checksum_address(address)] = (key, None if ttl is None else time.monotonic() + ttl)
+
+
+    def purge(self):
+        #
+        # Locks the keys that have expired
+        #
+        now = time.monotonic()
+        for address, (key, expiry) in list(self._keys.items()):
+            if expiry is not None and now >= expiry:
+                self.lock(address)
+
+
+    def lock(self, address=None):
+        #
+        # Overwrites one key (or all of them) with zeros and forgets it
+        #
+        addresses = list(self._keys) if address is None else [to_checksum_address(address)]
+        for address in addresses:
+            entry = self._keys.pop(address, None)
+            if entry is not None:
+                key = entry[0]
+                key[:] = bytes(len(key))
+
+
+    def addresses(self):
+        self.purge()
+        return list(self._keys)
+
+
+    def __contains__(self, address):
+        self.purge()
+        return to_checksum_address(address) in self._keys
+
+
+    def __len__(self):
+        self.purge()
+        return len(self._keys)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.lock()
+
+
+    def __del__(self):
+        try:
+            self.lock()
+        except Exception:
+            pass
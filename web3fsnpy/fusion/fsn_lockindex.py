@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#
+"""
+    Local index of time locked balances, answering interval queries without a call to the node
+"""
+#
+#
+import threading
+
+from .fsn_lockmath import (
+    LockSegments,
+)
+from .fsn_ingest import (
+    SendAsset,
+    TimeLock,
+    TakeSwap,
+    MakeSwap,
+    RecallSwap,
+)
+
+
+class TimeLockIndex:
+    """
+    Time locked balances of a set of accounts, loaded with getAllTimeLockBalances and queried locally.
+
+    Feed it the events of new blocks (it can be the sink of a BlockIngester). An account touched by
+    an event is reloaded from the node the next time it is queried.
+    """
+
+    def __init__(self, fsn):
+        self.fsn = fsn
+        self._accounts = {}         # account -> {assetId: LockSegments}
+        self._dirty = set()
+        self._makers = {}           # swapId -> maker, for the swaps made while following blocks
+        self._lock = threading.RLock()
+        self.lastBlock = None
+
+
+    def load(self, account):
+        balances = self.fsn.getAllTimeLockBalances(account)
+        segments = {}
+        for assetId, timelock in dict(balances).items():
+            segments[assetId.lower()] = LockSegments(timelock['Items'] or [])
+        with self._lock:
+            self._accounts[account.lower()] = segments
+            self._dirty.discard(account.lower())
+        return segments
+
+
+    def _segments(self, account, assetId):
+        account = account.lower()
+        with self._lock:
+            segments = self._accounts.get(account)
+            stale = segments is None or account in self._dirty
+        if stale:
+            segments = self.load(account)
+        return segments.get(assetId.lower())
+
+
+    def lockedAt(self, account, assetId, t):
+        segments = self._segments(account, assetId)
+        return 0 if segments is None else segments.lockedAt(t)
+
+
+    def lockedAtMany(self, account, assetId, times):
+        segments = self._segments(account, assetId)
+        if segments is None:
+            return [0]*len(times)
+        return [segments.lockedAt(t) for t in times]
+
+
+    def valueByInterval(self, account, assetId, startTime, endTime):
+        segments = self._segments(account, assetId)
+        return 0 if segments is None else segments.availableOver(startTime, endTime)
+
+
+    def valuesByInterval(self, account, assetId, intervals):
+        #
+        # intervals is a list of (startTime, endTime)
+        #
+        segments = self._segments(account, assetId)
+        if segments is None:
+            return [0]*len(intervals)
+        return [segments.availableOver(t0, t1) for t0, t1 in intervals]
+
+
+    def apply(self, event):
+        #
+        # Events that can change time locked balances mark the accounts involved for a reload
+        #
+        if isinstance(event, (TimeLock, SendAsset)):
+            touched = [event.sender, event.to]
+        elif isinstance(event, MakeSwap):
+            self._makers[event.swapId] = event.sender
+            touched = [event.sender]
+        elif isinstance(event, RecallSwap):
+            touched = [event.sender, self._makers.pop(event.swapId, None)]
+        elif isinstance(event, TakeSwap):
+            touched = [event.sender, self._makers.get(event.swapId)]
+        else:
+            return
+        with self._lock:
+            if isinstance(event, TakeSwap) and touched[1] is None:
+                #
+                # The maker of a swap made before we started following is not known, so reload everyone
+                #
+                self._dirty.update(self._accounts)
+            for account in touched:
+                if account is not None and account.lower() in self._accounts:
+                    self._dirty.add(account.lower())
+        self.lastBlock = event.blockNumber
+
+    __call__ = apply
+
+
+    def rollback(self, height):
+        #
+        # Called by a BlockFollower after a reorganisation
+        #
+        self.invalidate()
+        self.lastBlock = height
+
+
+    def invalidate(self, account=None):
+        with self._lock:
+            if account is None:
+                self._dirty.update(self._accounts)
+            else:
+                self._dirty.add(account.lower())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+#
+"""
+    Time lock arithmetic done locally, as the node does it, to check a planned time lock move before
+    it is built and sent
+"""
+#
+#
+import time
+import bisect
+from collections import (
+    namedtuple,
+)
+
+from .fsn_utils import (
+    to_integer,
+    TIME_FOREVER,
+)
+from .exceptions import (
+    TimeLockShortfall,
+)
+
+
+TimeLockMove = namedtuple('TimeLockMove', ['kind', 'need', 'fromBalance', 'fromTimeLock', 'toValue', 'toTimeLock'])
+
+
+class LockSegments:
+    """
+    The time lock of one asset for one account as a step function: values[i] is locked over
+    [times[i], times[i+1]), and the last value is locked from times[-1] to forever. An item
+    {'StartTime', 'EndTime', 'Value'} covers StartTime to EndTime inclusive.
+
+    Adding and subtracting merge the two step functions, splitting segments where either changes and
+    joining neighbours with the same value, so items() gives the same segments as the node. LockSegments
+    are not changed in place; add, sub and clip return new ones. A sparse table over values, built on
+    the first interval query, answers the minimum over any range of segments in O(1), which is the value
+    available over a whole interval.
+    """
+
+    __slots__ = ('times', 'values', '_table')
+
+    def __init__(self, items=(), now=None):
+        #
+        # items as returned by getTimeLockBalance (a dict or record with 'Items' is accepted). With now,
+        # expired items are dropped and the rest start no earlier than now
+        #
+        if hasattr(items, 'get'):
+            items = items.get('Items') or []
+        deltas = {}
+        for item in items:
+            start = to_integer(item['StartTime'])
+            end = to_integer(item['EndTime'])
+            value = to_integer(item['Value'])
+            if now is not None:
+                if end < now:
+                    continue
+                start = max(start, now)
+            if end < start or value == 0:
+                continue
+            deltas[start] = deltas.get(start, 0) + value
+            deltas[end + 1] = deltas.get(end + 1, 0) - value
+
+        times = [0]
+        values = [0]
+        level = 0
+        for t in sorted(deltas):
+            level += deltas[t]
+            times.append(t)
+            values.append(level)
+        self._normalise(times, values)
+
+
+    def _normalise(self, times, values):
+        #
+        # Join neighbouring segments with the same value, and drop empty segments
+        #
+        self.times = [times[0]]
+        self.values = [values[0]]
+        self._table = None
+        for t, v in zip(times[1:], values[1:]):
+            if t == self.times[-1]:
+                self.values[-1] = v
+                if len(self.values) > 1 and self.values[-2] == v:
+                    self.times.pop()
+                    self.values.pop()
+            elif v != self.values[-1]:
+                self.times.append(t)
+                self.values.append(v)
+
+
+    @classmethod
+    def single(cls, value, startTime, endTime=TIME_FOREVER):
+        return cls([{'StartTime': startTime, 'EndTime': endTime, 'Value': value}])
+
+
+    @classmethod
+    def _fromSteps(cls, times, values):
+        segments = cls.__new__(cls)
+        segments._normalise(times, values)
+        return segments
+
+
+    def _combine(self, other, sign):
+        #
+        # Merge the breakpoints of both step functions, self + sign*other at each
+        #
+        ta, va, tb, vb = self.times, self.values, other.times, other.values
+        times = []
+        values = []
+        i = j = 0
+        while i < len(ta) or j < len(tb):
+            if j == len(tb) or (i < len(ta) and ta[i] < tb[j]):
+                t = ta[i]
+                i += 1
+            elif i == len(ta) or tb[j] < ta[i]:
+                t = tb[j]
+                j += 1
+            else:
+                t = ta[i]
+                i += 1
+                j += 1
+            times.append(t)
+            values.append(va[i - 1] + sign*vb[j - 1])
+        return times, values
+
+
+    def clip(self, now):
+        #
+        # Drop what is locked before now, as the node drops expired items
+        #
+        i = self._segment(now)
+        return LockSegments._fromSteps([0, now] + self.times[i + 1:], [0, self.values[i]] + self.values[i + 1:])
+
+
+    def add(self, other):
+        return LockSegments._fromSteps(*self._combine(other, 1))
+
+
+    def shortfall(self, other):
+        #
+        # The parts of other that self does not cover, as a list of (startTime, endTime, missing value)
+        #
+        times, values = self._combine(other, -1)
+        gaps = []
+        for ii, (t, v) in enumerate(zip(times, values)):
+            if v < 0:
+                end = times[ii + 1] - 1 if ii + 1 < len(times) else TIME_FOREVER
+                gaps.append((t, min(end, TIME_FOREVER), -v))
+        return gaps
+
+
+    def sub(self, other):
+        #
+        # Raises TimeLockShortfall if other is not covered, as the node would reject the move
+        #
+        times, values = self._combine(other, -1)
+        if min(values) < 0:
+            gaps = self.shortfall(other)
+            raise TimeLockShortfall('Error in LockSegments: the time lock does not cover ', gaps)
+        return LockSegments._fromSteps(times, values)
+
+
+    def _sparseTable(self):
+        if self._table is None:
+            table = [self.values]
+            width = 1
+            while 2*width <= len(self.values):
+                prev = table[-1]
+                table.append([min(prev[i], prev[i + width]) for i in range(len(prev) - width)])
+                width *= 2
+            self._table = table
+        return self._table
+
+
+    def _segment(self, t):
+        return bisect.bisect_right(self.times, t) - 1
+
+
+    def lockedAt(self, t):
+        return self.values[self._segment(t)]
+
+
+    def availableOver(self, startTime, endTime=TIME_FOREVER):
+        #
+        # The value locked for the whole of [startTime, endTime]
+        #
+        if endTime < startTime:
+            raise ValueError('Error in availableOver: endTime is before startTime')
+        i0 = self._segment(startTime)
+        i1 = self._segment(endTime)
+        table = self._sparseTable()
+        level = (i1 - i0 + 1).bit_length() - 1
+        row = table[level]
+        return min(row[i0], row[i1 - (1 << level) + 1])
+
+
+    def covers(self, value, startTime, endTime=TIME_FOREVER):
+        return self.availableOver(startTime, endTime) >= value
+
+
+    def items(self):
+        #
+        # The segments with a value, in the node's Items format
+        #
+        items = []
+        for ii, (t, v) in enumerate(zip(self.times, self.values)):
+            if v == 0:
+                continue
+            end = self.times[ii + 1] - 1 if ii + 1 < len(self.times) else TIME_FOREVER
+            items.append({'StartTime': t, 'EndTime': min(end, TIME_FOREVER), 'Value': v})
+        return items
+
+
+    def isEmpty(self):
+        return not any(self.values)
+
+
+    def __eq__(self, other):
+        return isinstance(other, LockSegments) and self.times == other.times and self.values == other.values
+
+
+    def __repr__(self):
+        return 'LockSegments({})'.format(self.items())
+
+
+def _window(startTime, endTime, now):
+    if now is None:
+        now = int(time.time())
+    startTime = max(to_integer(startTime) if startTime is not None else now, now)
+    endTime = to_integer(endTime) if endTime is not None else TIME_FOREVER
+    if endTime < startTime:
+        raise ValueError('Error in planning a time lock move: the end time is before the start time')
+    return startTime, endTime, now
+
+
+def planAssetToTimeLock(balance, timelock, value, startTime=None, endTime=None, now=None, toSelf=False):
+    #
+    # The sender pays value from its asset balance. The receiver gets it locked over [start, end] and the
+    # sender keeps the rest of [now, forever] as a time lock. Sent to itself, the sender gets all of [now, forever]
+    #
+    startTime, endTime, now = _window(startTime, endTime, now)
+    if balance < value:
+        raise TimeLockShortfall('Error in planAssetToTimeLock: the balance is less than the value ',
+                                [(now, TIME_FOREVER, value - balance)])
+    need = LockSegments.single(value, startTime, endTime)
+    total = LockSegments.single(value, now)
+    timelock = timelock.clip(now)
+    if toSelf:
+        return TimeLockMove('assetToTimeLock', need, balance - value, timelock.add(total), 0, LockSegments())
+    return TimeLockMove('assetToTimeLock', need, balance - value, timelock.add(total.sub(need)), 0, need)
+
+
+def planTimeLockToTimeLock(timelock, value, startTime=None, endTime=None, now=None, toSelf=False):
+    #
+    # [start, end] of value moves from the sender's time lock to the receiver's
+    #
+    startTime, endTime, now = _window(startTime, endTime, now)
+    need = LockSegments.single(value, startTime, endTime)
+    remaining = timelock.clip(now).sub(need)
+    if toSelf:
+        return TimeLockMove('timeLockToTimeLock', need, None, remaining.add(need), 0, LockSegments())
+    return TimeLockMove('timeLockToTimeLock', need, None, remaining, 0, need)
+
+
+def planTimeLockToAsset(timelock, value, now=None, balance=None, toSelf=False):
+    #
+    # Needs value locked from now to forever, which becomes value of the receiver's asset balance
+    #
+    startTime, endTime, now = _window(None, None, now)
+    need = LockSegments.single(value, now)
+    remaining = timelock.clip(now).sub(need)
+    if toSelf and balance is not None:
+        balance += value
+    return TimeLockMove('timeLockToAsset', need, balance, remaining, 0 if toSelf else value, LockSegments())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+#
+"""
+    Compact record types for time locks, tickets, swaps and assets. Records use __slots__ instead of a
+    dict per object, and large collections keep their numbers in arrays. Every record converts back to
+    exactly the dict it was made from with toDict().
+"""
+#
+#
+import sys
+from array import array
+from collections.abc import (
+    Mapping,
+    Sequence,
+)
+
+from .fsn_utils import (
+    TIME_FOREVER,
+)
+from .fsn_api import (
+    LazySwap,
+    SWAP_ROW_FIELDS,
+    SWAP_DATA_FIELDS,
+)
+
+
+_MISSING = object()
+
+
+class Record:
+    """
+    Base class of the records. FIELDS are kept in slots, any other keys of the source dict in _extra.
+    Fields can be read as attributes or with [] like the AttributeDicts returned by web3. A field that
+    was not in the source dict is not set, and is left out again by toDict().
+    """
+
+    __slots__ = ('_extra',)
+
+    FIELDS = ()
+
+
+    def __init__(self, **fields):
+        extra = None
+        for key, value in fields.items():
+            if key in self.FIELDS:
+                setattr(self, key, value)
+            else:
+                extra = extra or {}
+                extra[key] = value
+        self._extra = extra
+
+
+    @classmethod
+    def fromDict(cls, d):
+        record = cls.__new__(cls)
+        n = 0
+        for key in cls.FIELDS:
+            value = d.get(key, _MISSING)
+            if value is not _MISSING:
+                setattr(record, key, value)
+                n += 1
+        record._extra = None
+        if n < len(d):
+            record._extra = {key: value for key, value in d.items() if key not in cls.FIELDS}
+        return record
+
+
+    def toDict(self):
+        d = {}
+        for key in self.FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                d[key] = value
+        if self._extra:
+            d.update(self._extra)
+        return d
+
+
+    def __getattr__(self, key):
+        #
+        # Only called for names that are not slots, i.e. extra keys
+        #
+        extra = object.__getattribute__(self, '_extra')
+        if extra is not None and key in extra:
+            return extra[key]
+        raise AttributeError(key)
+
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.toDict()
+        return self.toDict() == other
+
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.toDict())
+
+
+class TimeLockItem(Record):
+    __slots__ = ('StartTime', 'EndTime', 'Value')
+    FIELDS = __slots__
+
+
+class Ticket(Record):
+    #
+    # ID is the key of the ticket in allTickets, and is not part of toDict()
+    #
+    __slots__ = ('ID', 'Owner', 'Height', 'StartTime', 'ExpireTime')
+    FIELDS = __slots__[1:]
+
+
+class AssetInfo(Record):
+    __slots__ = ('ID', 'Owner', 'Name', 'Symbol', 'Decimals', 'Total', 'CanChange', 'Description')
+    FIELDS = __slots__
+
+
+class Swap(Record):
+    __slots__ = tuple(SWAP_ROW_FIELDS + SWAP_DATA_FIELDS)
+    FIELDS = __slots__
+
+    #
+    # Addresses and asset ids repeat across swaps, so one copy of each is kept
+    #
+    INTERNED = ('fromAddress', 'fromAsset', 'toAsset', 'recCreated')
+
+
+    @classmethod
+    def fromRow(cls, row):
+        #
+        # From a raw api row or a LazySwap, without making the intermediate dict
+        #
+        if not isinstance(row, LazySwap):
+            row = LazySwap(row)
+        record = cls.__new__(cls)
+        raw = row.raw
+        data = row.data
+        for key in SWAP_ROW_FIELDS:
+            setattr(record, key, raw.get(key))
+        for key in SWAP_DATA_FIELDS:
+            setattr(record, key, data.get(key))
+        for key in cls.INTERNED:
+            value = getattr(record, key)
+            if type(value) is str:
+                setattr(record, key, sys.intern(value))
+        toAssets = record.ToAssetID
+        if type(toAssets) is list:
+            record.ToAssetID = [sys.intern(v) if type(v) is str else v for v in toAssets]
+        record._extra = None
+        return record
+
+
+def _isUint64(value):
+    return type(value) is int and 0 <= value <= TIME_FOREVER       # The largest uint64
+
+
+class TimeLockItems(Sequence):
+    """
+    The Items of a time lock, with StartTime and EndTime in arrays of unsigned 64 bit ints. Values are
+    kept as they came (they can be larger than 64 bits). Indexing gives TimeLockItem records.
+    """
+
+    __slots__ = ('starts', 'ends', 'values')
+
+
+    def __init__(self, starts=(), ends=(), values=()):
+        self.starts = array('Q', starts)
+        self.ends = array('Q', ends)
+        self.values = list(values)
+
+
+    @classmethod
+    def fromList(cls, items):
+        #
+        # Items that do not fit the arrays (times that are not ints, other keys) give a list of records instead
+        #
+        starts = []
+        ends = []
+        values = []
+        for item in items:
+            if len(item) != 3 or not _isUint64(item.get('StartTime')) or not _isUint64(item.get('EndTime')) \
+                    or 'Value' not in item:
+                return [TimeLockItem.fromDict(item) for item in items]
+            starts.append(item['StartTime'])
+            ends.append(item['EndTime'])
+            values.append(item['Value'])
+        return cls(starts, ends, values)
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TimeLockItems(self.starts[index], self.ends[index], self.values[index])
+        return TimeLockItem(StartTime=self.starts[index], EndTime=self.ends[index], Value=self.values[index])
+
+
+    def toList(self):
+        return [{'StartTime': s, 'EndTime': e, 'Value': v} for s, e, v in zip(self.starts, self.ends, self.values)]
+
+
+class TimeLockRecord(Record):
+    """
+    A time lock balance, as returned by getTimeLockBalance. Items is a TimeLockItems
+    """
+    __slots__ = ('Items',)
+    FIELDS = __slots__
+
+
+    @classmethod
+    def fromDict(cls, d):
+        record = super().fromDict(d)
+        items = getattr(record, 'Items', None)
+        if items is not None:
+            record.Items = TimeLockItems.fromList(items)
+        return record
+
+
+    def toDict(self):
+        d = super().toDict()
+        items = d.get('Items')
+        if isinstance(items, TimeLockItems):
+            d['Items'] = items.toList()
+        elif items is not None:
+            d['Items'] = [item.toDict() for item in items]
+        return d
+
+
+class TicketTable(Mapping):
+    """
+    The tickets of allTickets, keyed by ticket id. Heights and times are kept in arrays and owner
+    addresses are interned, as the same owners hold many tickets. Looking a ticket up gives a Ticket record.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.owners = []
+        self.heights = array('Q')
+        self.startTimes = array('Q')
+        self.expireTimes = array('Q')
+        self._rows = {}
+        self._extras = {}           # row -> Ticket for the tickets that do not fit the arrays
+
+
+    @classmethod
+    def fromDict(cls, tickets):
+        table = cls()
+        for ticketId, info in tickets.items():
+            table.add(ticketId, info)
+        return table
+
+
+    def add(self, ticketId, info):
+        row = len(self.ids)
+        self._rows[ticketId] = row
+        self.ids.append(ticketId)
+        fits = len(info) == 4 and isinstance(info.get('Owner'), str) and _isUint64(info.get('Height')) \
+            and _isUint64(info.get('StartTime')) and _isUint64(info.get('ExpireTime'))
+        if fits:
+            self.owners.append(sys.intern(info['Owner']))
+            self.heights.append(info['Height'])
+            self.startTimes.append(info['StartTime'])
+            self.expireTimes.append(info['ExpireTime'])
+        else:
+            ticket = Ticket.fromDict(info)
+            ticket.ID = ticketId
+            self._extras[row] = ticket
+            self.owners.append(None)
+            self.heights.append(0)
+            self.startTimes.append(0)
+            self.expireTimes.append(0)
+
+
+    def _ticket(self, row):
+        ticket = self._extras.get(row)
+        if ticket is not None:
+            return ticket
+        ticket = Ticket(Owner=self.owners[row], Height=self.heights[row], StartTime=self.startTimes[row],
+                        ExpireTime=self.expireTimes[row])
+        ticket.ID = self.ids[row]
+        return ticket
+
+
+    def __getitem__(self, ticketId):
+        return self._ticket(self._rows[ticketId])
+
+
+    def __iter__(self):
+        return iter(self.ids)
+
+
+    def __len__(self):
+        return len(self.ids)
+
+
+    def toDict(self):
+        return {self.ids[row]: self._ticket(row).toDict() for row in range(len(self.ids))}
+
+
+def _plain(value):
+    #
+    # AttributeDicts (and lists of them) from web3 to plain dicts
+    #
+    if isinstance(value, Mapping):
+        return {key: _plain(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def timeLockRecord(timelock):
+    return TimeLockRecord.fromDict(_plain(timelock))
+
+
+def ticketTable(tickets):
+    return TicketTable.fromDict(_plain(tickets or {}))
+
+
+def assetInfo(asset):
+    return AssetInfo.fromDict(_plain(asset))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+#
+"""
+    Local asset registry. Keeps a copy of the asset lists served by Fusion's api in an SQLite file,
+    indexed by asset id, symbol and name, and refreshes it incrementally in the background.
+"""
+#
+#
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from .exceptions import (
+    FsnApiError,
+)
+
+
+ASSET_PAGE_SIZE = 100
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    asset_id    TEXT PRIMARY KEY,
+    symbol      TEXT,
+    name        TEXT,
+    decimals    INTEGER,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_symbol ON assets (symbol);
+CREATE INDEX IF NOT EXISTS assets_name ON assets (name);
+
+CREATE TABLE IF NOT EXISTS verified (
+    asset_id    TEXT PRIMARY KEY,
+    short_name  TEXT,
+    info        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS verified_short_name ON verified (short_name);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value       TEXT
+);
+"""
+
+
+def defaultRegistryPath(network):
+    return os.path.join(os.path.expanduser('~'), '.web3fsnpy', 'assets-{}.sqlite'.format(network))
+
+
+class AssetRegistry:
+    """
+    Indexed local copy of the 'assets/all' and 'assets/verified' lists of the api.
+
+    Lookups are answered from in-memory dicts loaded from the SQLite file, so they cost O(1) and
+    need no network access. New assets are pulled in by refresh(), which walks 'assets/all' from the
+    newest asset and stops at the first page that holds nothing new.
+    """
+
+    def __init__(self, api, path=None, refresh_interval=600, background=True, min_miss_refresh=30):
+        self.api = api
+        if path is None:
+            path = defaultRegistryPath(api.network)
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.min_miss_refresh = min_miss_refresh
+        self.lastError = None
+
+        self._lock = threading.RLock()
+        self._refreshLock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+        self._byId = {}
+        self._bySymbol = {}
+        self._byName = {}
+        self._verifiedById = {}
+        self._verifiedByShortName = {}
+        self._lastRefresh = 0
+        self._lastMissRefresh = 0
+        self._load()
+
+        self._stop = threading.Event()
+        self._thread = None
+        if background and refresh_interval:
+            self._thread = threading.Thread(target=self._refreshLoop, name='AssetRegistry', daemon=True)
+            self._thread.start()
+
+
+    def _load(self):
+        with self._lock:
+            for data, in self._db.execute('SELECT data FROM assets'):
+                self._index(json.loads(data))
+            for info, in self._db.execute('SELECT info FROM verified'):
+                self._indexVerified(json.loads(info))
+
+
+    def _index(self, asset):
+        assetId = asset['AssetID'].lower()
+        old = self._byId.get(assetId)
+        if old is not None:
+            self._bySymbol.get(old.get('Symbol'), {}).pop(assetId, None)
+            self._byName.get(old.get('Name'), {}).pop(assetId, None)
+        self._byId[assetId] = asset
+        self._bySymbol.setdefault(asset.get('Symbol'), {})[assetId] = asset
+        self._byName.setdefault(asset.get('Name'), {})[assetId] = asset
+
+
+    def _indexVerified(self, info):
+        self._verifiedById[info['assetID'].lower()] = info
+        self._verifiedByShortName[info['shortName']] = info
+
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._db.close()
+
+
+    def _refreshLoop(self):
+        if not self._byId:
+            self._refreshQuietly()
+        while not self._stop.wait(self.refresh_interval):
+            self._refreshQuietly()
+
+
+    def _refreshQuietly(self):
+        try:
+            self.refresh()
+        except FsnApiError as e:
+            self.lastError = e
+
+
+    def refresh(self):
+        #
+        # Incremental update. Returns the number of assets that were added or changed
+        #
+        with self._refreshLock:
+            return self._refresh()
+
+
+    def _refresh(self):
+        verified = [info for info in self.api.fsnapiVerifiedAssetInfo() if isinstance(info, dict)]
+
+        changed = []
+        complete = self._getMeta('complete') == '1'
+        pageNo = 0
+        while True:
+            rows = [row for row in self.api.fsnapiAssetAllInfo(pageNo) if isinstance(row, dict)]
+            fresh = []
+            for row in rows:
+                asset = json.loads(row['data']) if isinstance(row.get('data'), str) else row.get('data', row)
+                known = self._byId.get(asset['AssetID'].lower())
+                if known != asset:
+                    fresh.append(asset)
+            changed.extend(fresh)
+            if len(rows) < ASSET_PAGE_SIZE:
+                complete = True
+                break
+            if complete and not fresh:
+                break
+            pageNo += 1
+
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO assets (asset_id, symbol, name, decimals, data) VALUES (?, ?, ?, ?, ?)',
+                    [(a['AssetID'].lower(), a.get('Symbol'), a.get('Name'), a.get('Decimals'), json.dumps(a))
+                     for a in changed],
+                )
+                self._db.execute('DELETE FROM verified')
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO verified (asset_id, short_name, info) VALUES (?, ?, ?)',
+                    [(v['assetID'].lower(), v['shortName'], json.dumps(v)) for v in verified],
+                )
+                self._setMeta('complete', '1' if complete else '0')
+                self._setMeta('refreshed', str(int(time.time())))
+            for asset in changed:
+                self._index(asset)
+            self._verifiedById = {}
+            self._verifiedByShortName = {}
+            for info in verified:
+                self._indexVerified(info)
+            self._lastRefresh = time.time()
+
+        return len(changed)
+
+
+    def _getMeta(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+
+    def _setMeta(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+
+    def _refreshOnMiss(self):
+        #
+        # An unknown key may be a newly created asset. Refresh, but not more often than min_miss_refresh
+        #
+        if time.time() - max(self._lastRefresh, self._lastMissRefresh) < self.min_miss_refresh:
+            return False
+        self._lastMissRefresh = time.time()
+        self.refresh()
+        return True
+
+
+    def assetIdToAssetInfo(self, assetId):
+        asset = self._byId.get(assetId.lower())
+        if asset is None and self._refreshOnMiss():
+            asset = self._byId.get(assetId.lower())
+        return asset
+
+
+    def assetNameToAssetInfo(self, shortName):
+        #
+        # Looks up the verified list, as the api's verified short names are what users type
+        #
+        info = self._verifiedByShortName.get(shortName)
+        if info is None and self._refreshOnMiss():
+            info = self._verifiedByShortName.get(shortName)
+        return info
+
+
+    def verifiedAssetInfo(self, assetId):
+        return self._verifiedById.get(assetId.lower())
+
+
+    def assetsBySymbol(self, symbol):
+        return list(self._bySymbol.get(symbol, {}).values())
+
+
+    def assetsByName(self, name):
+        return list(self._byName.get(name, {}).values())
+
+
+    def __len__(self):
+        return len(self._byId)
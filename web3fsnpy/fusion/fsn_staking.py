@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+#
+"""
+    Staking analytics over block ranges: blocks won, rewards and tickets per owner
+"""
+#
+#
+import os
+import json
+import sqlite3
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .fsn_utils import (
+    to_integer,
+)
+from .fsn_ingest import (
+    BatchRpc,
+)
+from .fsn_columnar import (
+    columnsToFrame,
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    number      INTEGER PRIMARY KEY,
+    miner       TEXT,
+    reward      TEXT,
+    stake       TEXT
+);
+"""
+
+WEI_PER_FSN = 10**18
+
+
+def defaultStakingPath(network):
+    return os.path.join(os.path.expanduser('~'), '.web3fsnpy', 'staking-{}.sqlite'.format(network))
+
+
+class StakingAnalytics:
+    """
+    Reads the miner (eth_getBlockByNumber), the reward (fsn_getBlockReward) and, every stake_every blocks,
+    the tickets per owner (fsn_getStakeInfo) of each block in a range. Blocks go in JSON-RPC batches of
+    batch_size, spread over 'workers' threads.
+
+    Results for blocks at least 'confirmations' deep are kept in an SQLite cache, as they no longer change,
+    so a range is only read from the node once. The cache is in memory unless a path is given.
+    """
+
+    def __init__(self, fsn, batch_size=50, workers=4, stake_every=1, path=':memory:', confirmations=30):
+        self.fsn = fsn
+        self.rpc = BatchRpc(fsn.web3)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.stake_every = stake_every
+        self.confirmations = confirmations
+        if path is None:
+            path = defaultStakingPath(fsn.api.network)
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+    def _cached(self, numbers):
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT number, miner, reward, stake FROM blocks WHERE number BETWEEN ? AND ?', (numbers[0], numbers[-1])
+            ).fetchall()
+        return {number: (miner, int(reward), None if stake is None else json.loads(stake))
+                for number, miner, reward, stake in rows}
+
+
+    def _wantStake(self, number):
+        return number % self.stake_every == 0
+
+
+    def fetchBlocks(self, numbers, head):
+        #
+        # Returns {number: (miner, reward in Wei, {owner: tickets} or None)}
+        #
+        results = self._cached(numbers)
+        todo = [n for n in numbers if n not in results or (self._wantStake(n) and results[n][2] is None)]
+        if not todo:
+            return results
+
+        calls = []
+        for n in todo:
+            calls.append(('eth_getBlockByNumber', [hex(n), False]))
+            calls.append(('fsn_getBlockReward', [hex(n)]))
+        stakeBlocks = [n for n in todo if self._wantStake(n)]
+        calls.extend(('fsn_getStakeInfo', [hex(n)]) for n in stakeBlocks)
+        replies = self.rpc.call(calls)
+
+        stakes = {}
+        for n, info in zip(stakeBlocks, replies[2*len(todo):]):
+            stakes[n] = {entry['owner'].lower(): to_integer(entry['tickets']) for entry in (info['stakeInfo'] or [])}
+        fresh = []
+        for ii, n in enumerate(todo):
+            block, reward = replies[2*ii], replies[2*ii + 1]
+            results[n] = (block['miner'].lower(), to_integer(reward), stakes.get(n))
+            if n <= head - self.confirmations:
+                fresh.append((n, results[n][0], str(results[n][1]),
+                              None if results[n][2] is None else json.dumps(results[n][2])))
+
+        with self._lock:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?)', fresh)
+        return results
+
+
+    def iterBatches(self, startBlock, endBlock):
+        #
+        # Yields the results of fetchBlocks for startBlock to endBlock inclusive, one batch at a time in
+        # block order. At most 2*workers batches are in flight, so memory does not grow with the range
+        #
+        head = to_integer(self.fsn.web3.manager.request_blocking('eth_blockNumber', []))
+        batches = (list(range(b, min(b + self.batch_size, endBlock + 1)))
+                   for b in range(startBlock, endBlock + 1, self.batch_size))
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for numbers in batches:
+                    pending.append(executor.submit(self.fetchBlocks, numbers, head))
+                    if len(pending) >= 2*self.workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+    def collect(self, startBlock, endBlock):
+        #
+        # Per block results for startBlock to endBlock inclusive. For long ranges use summary, which
+        # does not keep them
+        #
+        results = {}
+        for batch in self.iterBatches(startBlock, endBlock):
+            results.update(batch)
+        return results
+
+
+    def summary(self, startBlock, endBlock, frame=False):
+        #
+        # One row per owner that mined a block or held tickets in the range. Each batch is added to the
+        # totals and dropped
+        #
+        totals = StakingTotals()
+        for batch in self.iterBatches(startBlock, endBlock):
+            for n in sorted(batch):
+                totals.add(*batch[n])
+        return totals.summary(frame)
+
+
+class StakingTotals:
+    """
+    Per owner totals of blocks won, rewards and tickets, added to block by block. Owners are numbered
+    in the order they are first seen, and the counts are kept in arrays indexed by that number.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.wins = array('q')
+        self.ticketSums = array('q')
+        self.rewards = []           # Wei overflow 64 bits
+        self.blocks = 0
+        self.samples = 0
+
+
+    def _owner(self, owner):
+        ii = self.index.get(owner)
+        if ii is None:
+            ii = self.index[owner] = len(self.wins)
+            self.wins.append(0)
+            self.ticketSums.append(0)
+            self.rewards.append(0)
+        return ii
+
+
+    def add(self, miner, reward, stake):
+        #
+        # One block: its miner, reward in Wei and {owner: tickets}, or None if its stake was not read
+        #
+        self.blocks += 1
+        ii = self._owner(miner)
+        self.wins[ii] += 1
+        self.rewards[ii] += reward
+        if stake is not None:
+            self.samples += 1
+            for owner, tickets in stake.items():
+                self.ticketSums[self._owner(owner)] += tickets
+
+
+    def summary(self, frame=False):
+        wins = self.wins
+        rewards = self.rewards
+        ticketSums = self.ticketSums
+        nBlocks = self.blocks
+        samples = self.samples
+        totalTickets = sum(ticketSums)
+        columns = {
+            'owner':        list(self.index),
+            'blocksWon':    list(wins),
+            'rewardWei':    list(rewards),
+            'reward':       [r / WEI_PER_FSN for r in rewards],
+            'meanTickets':  [t / samples if samples else 0.0 for t in ticketSums],
+            'winShare':     [w / nBlocks if nBlocks else 0.0 for w in wins],
+            'ticketShare':  [t / totalTickets if totalTickets else 0.0 for t in ticketSums],
+        }
+        if np is not None:
+            columns['blocksWon'] = np.array(wins, dtype=np.int64)
+            for key in ['reward', 'meanTickets', 'winShare', 'ticketShare']:
+                columns[key] = np.array(columns[key], dtype=np.float64)
+            rewardWei = np.empty(len(rewards), dtype=object)        # Wei overflow 64 bits
+            rewardWei[:] = rewards
+            columns['rewardWei'] = rewardWei
+
+        if frame:
+            return columnsToFrame(columns)
+        return columns
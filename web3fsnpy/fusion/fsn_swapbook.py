@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+#
+"""
+    In memory book of the open swaps, indexed by asset pair and sorted by price
+"""
+#
+#
+import heapq
+import bisect
+import threading
+from collections import deque
+
+from .fsn_utils import (
+    to_integer,
+)
+from .fsn_ingest import (
+    MakeSwap,
+    TakeSwap,
+    RecallSwap,
+)
+
+
+def _amount(value):
+    #
+    # Amounts come as ints, decimal or hex strings, or lists of them for multi swaps
+    #
+    if isinstance(value, list):
+        return sum(_amount(v) for v in value)
+    if value is None:
+        return 0
+    return to_integer(value)
+
+
+def _assetKey(assetId):
+    if isinstance(assetId, (list, tuple)):
+        return tuple(a.lower() for a in assetId)
+    return assetId.lower()
+
+
+def _targets(targes):
+    return tuple(sorted(t.lower() for t in (targes or [])))
+
+
+class SwapBook:
+    """
+    Open swaps indexed by (FromAssetID, ToAssetID). For each pair the swaps are kept in lists sorted by
+    price, one for the swaps anyone can take and one per address for the swaps targeted at it
+    (the 'Targes' of the swap), so the best offer for a taker is found in O(log n).
+
+    The price of a swap is MinToAmount / MinFromAmount, what the taker pays per unit of the asset
+    received, so lower is better. For multi swaps the amounts are summed and the asset keys are tuples.
+
+    Load the open swaps with load(), then keep the book current by passing it the events of new blocks
+    (it can be used directly as the sink of a BlockIngester). Callbacks registered with onChange are
+    called with ('add' | 'update' | 'remove', swap) for every change.
+
+    The changes made by the events of the last 'history' blocks are journalled, so rollback(height) can undo
+    them after a reorganisation. A deeper rollback reloads the book from the api it was loaded from.
+    """
+
+    def __init__(self, history=128):
+        self._swaps = {}
+        self._public = {}           # pair -> sorted [(price, swapId)]
+        self._targeted = {}         # (pair, address) -> sorted [(price, swapId)]
+        self._callbacks = []
+        self._lock = threading.RLock()
+        self._journal = deque()     # (blockNumber, swapId, copy of the swap before the event, or None)
+        self._api = None
+        self.history = history
+        self.lastBlock = None
+
+
+    def onChange(self, callback):
+        self._callbacks.append(callback)
+
+
+    def _notify(self, kind, swap):
+        for callback in self._callbacks:
+            callback(kind, swap)
+
+
+    def _lists(self, swap):
+        pair = swap['pair']
+        if not swap['targes']:
+            return [self._public.setdefault(pair, [])]
+        return [self._targeted.setdefault((pair, target), []) for target in swap['targes']]
+
+
+    def add(self, swap):
+        #
+        # swap is a dict with swapId, fromAddress, fromAssetId, toAssetId, minFromAmount, minToAmount, swapSize and targes
+        #
+        swapId = swap['swapId'].lower()
+        minFrom = _amount(swap['minFromAmount'])
+        minTo = _amount(swap['minToAmount'])
+        swap = dict(
+            swap,
+            swapId=swapId,
+            minFromAmount=minFrom,
+            minToAmount=minTo,
+            swapSize=_amount(swap['swapSize']),
+            targes=_targets(swap.get('targes')),
+            pair=(_assetKey(swap['fromAssetId']), _assetKey(swap['toAssetId'])),
+            price=minTo / minFrom if minFrom else float('inf'),
+        )
+        with self._lock:
+            if swapId in self._swaps:
+                self._unindex(self._swaps[swapId])
+            self._swaps[swapId] = swap
+            for entries in self._lists(swap):
+                bisect.insort(entries, (swap['price'], swapId))
+        self._notify('add', swap)
+        return swap
+
+
+    def _unindex(self, swap):
+        key = (swap['price'], swap['swapId'])
+        for entries in self._lists(swap):
+            ii = bisect.bisect_left(entries, key)
+            if ii < len(entries) and entries[ii] == key:
+                del entries[ii]
+
+
+    def remove(self, swapId):
+        with self._lock:
+            swap = self._swaps.pop(swapId.lower(), None)
+            if swap is None:
+                return None
+            self._unindex(swap)
+        self._notify('remove', swap)
+        return swap
+
+
+    def take(self, swapId, size):
+        with self._lock:
+            swap = self._swaps.get(swapId.lower())
+            if swap is None:
+                return None
+            swap['swapSize'] -= size
+            if swap['swapSize'] > 0:
+                self._notify('update', swap)
+                return swap
+        return self.remove(swapId)
+
+
+    def load(self, api, page_size=1000, prefetch=2):
+        #
+        # Read every open swap from the api (see fsnapi.iterSwaps)
+        #
+        self._api = api
+        n = 0
+        for row in api.iterSwaps(page_size, prefetch):
+            self.add({
+                'swapId':           row['swapID'],
+                'fromAddress':      row.get('fromAddress'),
+                'fromAssetId':      row.get('FromAssetID', row.get('fromAsset')),
+                'toAssetId':        row.get('ToAssetID', row.get('toAsset')),
+                'minFromAmount':    row.get('MinFromAmount'),
+                'minToAmount':      row.get('MinToAmount'),
+                'swapSize':         row.get('SwapSize'),
+                'targes':           row.get('Targes'),
+                'height':           row.get('height'),
+            })
+            n += 1
+        return n
+
+
+    def apply(self, event):
+        #
+        # Apply one event from fsn_ingest, other events are ignored
+        #
+        if not isinstance(event, (MakeSwap, TakeSwap, RecallSwap)):
+            return
+        if event.swapId is not None:
+            with self._lock:
+                before = self._swaps.get(event.swapId.lower())
+                self._journal.append((event.blockNumber, event.swapId.lower(), None if before is None else dict(before)))
+                while self._journal and self._journal[0][0] <= event.blockNumber - self.history:
+                    self._journal.popleft()
+        if isinstance(event, MakeSwap):
+            if event.swapId is None:
+                return
+            self.add({
+                'swapId':           event.swapId,
+                'fromAddress':      event.sender,
+                'fromAssetId':      event.fromAssetId,
+                'toAssetId':        event.toAssetId,
+                'minFromAmount':    event.minFromAmount,
+                'minToAmount':      event.minToAmount,
+                'swapSize':         event.swapSize,
+                'targes':           event.targes,
+                'height':           event.blockNumber,
+            })
+        elif isinstance(event, TakeSwap):
+            if event.swapId is not None:
+                self.take(event.swapId, event.size or 0)
+        elif isinstance(event, RecallSwap):
+            if event.swapId is not None:
+                self.remove(event.swapId)
+        self.lastBlock = event.blockNumber
+
+    __call__ = apply
+
+
+    def rollback(self, height):
+        #
+        # Called by a BlockFollower after a reorganisation: undo the events of the blocks above height
+        #
+        with self._lock:
+            if self.lastBlock is not None and self.lastBlock - height > self.history:
+                #
+                # The journal does not reach back that far. The api may already hold some blocks of the new branch
+                #
+                if self._api is None:
+                    raise ValueError('Error in SwapBook: cannot roll back more than history blocks without an api to reload from ', height)
+                self._journal.clear()
+                for swapId in list(self._swaps):
+                    self.remove(swapId)
+                self.load(self._api)
+                self.lastBlock = height
+                return
+            while self._journal and self._journal[-1][0] > height:
+                blockNumber, swapId, before = self._journal.pop()
+                current = self._swaps.get(swapId)
+                if current is not None:
+                    self._unindex(current)
+                    del self._swaps[swapId]
+                if before is None:
+                    if current is not None:
+                        self._notify('remove', current)
+                    continue
+                self._swaps[swapId] = before
+                for entries in self._lists(before):
+                    bisect.insort(entries, (before['price'], swapId))
+                self._notify('add' if current is None else 'update', before)
+            if self.lastBlock is not None and self.lastBlock > height:
+                self.lastBlock = height
+
+
+    def _entries(self, fromAssetId, toAssetId, taker):
+        pair = (_assetKey(fromAssetId), _assetKey(toAssetId))
+        lists = [self._public.get(pair, [])]
+        if taker is not None:
+            lists.append(self._targeted.get((pair, taker.lower()), []))
+        return lists
+
+
+    def bestOffer(self, fromAssetId, toAssetId, taker=None):
+        #
+        # The cheapest swap giving fromAssetId for toAssetId that taker may take. Without a taker
+        # only swaps open to everyone are considered.
+        #
+        with self._lock:
+            heads = [entries[0] for entries in self._entries(fromAssetId, toAssetId, taker) if entries]
+            if not heads:
+                return None
+            return self._swaps[min(heads)[1]]
+
+
+    def offers(self, fromAssetId, toAssetId, taker=None, maxPrice=None, limit=None):
+        #
+        # Swaps for the pair, cheapest first, up to maxPrice
+        #
+        with self._lock:
+            result = []
+            for price, swapId in heapq.merge(*self._entries(fromAssetId, toAssetId, taker)):
+                if maxPrice is not None and price > maxPrice:
+                    break
+                if limit is not None and len(result) >= limit:
+                    break
+                result.append(self._swaps[swapId])
+            return result
+
+
+    def getSwap(self, swapId):
+        return self._swaps.get(swapId.lower())
+
+
+    def pairs(self):
+        with self._lock:
+            return {swap['pair'] for swap in self._swaps.values()}
+
+
+    def __len__(self):
+        return len(self._swaps)
@@ -52,6 +52,8 @@ from web3.datastructures import (
 
 from .fsn_timelocks import (
     to_hex_if_datestring,
+    referenceTime,
+    resolveNow,
 )
 
 
@@ -133,7 +135,7 @@ REQUIRED_MAKESWAP_PARAMS = [
 ]
 
 
-def buildMakeSwapTx(transaction, defaultChainId):
+def buildMakeSwapTx(transaction, defaultChainId, now=None):
     defaults = {}
     alreadygot = {}
     for key, default_val in MAKESWAP_DEFAULTS.items():
@@ -145,6 +147,7 @@ def buildMakeSwapTx(transaction, defaultChainId):
             
     transaction_merged = merge(defaults, alreadygot)
     transaction_merged['chainId'] = defaultChainId
+    transaction_merged = resolveNow(transaction_merged, ['FromStartTime', 'FromEndTime', 'ToStartTime', 'ToEndTime'], now)
     transaction_new = unsigned_makeswap_formatter(transaction_merged)
     
     assert_check_makeswap_params(transaction_new)
@@ -170,8 +173,9 @@ def assert_check_makeswap_params(makeswap_params):
 
 
 
-def buildMakeMultiSwapTx(transaction, defaultChainId):
+def buildMakeMultiSwapTx(transaction, defaultChainId, now=None):
     tx = transaction['params']
+    now = referenceTime(now)            # The same 'now' for every time in the transaction
     if len(tx) > 0:
         #print(tx)
         for ii in range(len(tx)):
@@ -184,7 +188,7 @@ def buildMakeMultiSwapTx(transaction, defaultChainId):
                 if 'ToStartTime' not in tx[ii]:
                     tx[ii]['ToStartTime'] = []
                     for jj in range(nToAsset):
-                        tx[ii]['ToStartTime'].append(to_hex_if_datestring('now'))
+                        tx[ii]['ToStartTime'].append(to_hex_if_datestring('now', now))
                 else:
                     if not isinstance(tx[ii]['ToStartTime'], list):
                         raise ValueError('In buildMakeMultiSwapTx, ToStartTime is not a list')
@@ -192,7 +196,7 @@ def buildMakeMultiSwapTx(transaction, defaultChainId):
                         raise ValueError('In buildMakeMultiSwapTx, ToStartTime list is not the same length as ToAssetID')
                     else:
                         for jj in range(nToAsset):
-                            tx[ii]['ToStartTime'][jj] = to_hex_if_datestring(tx[ii]['ToStartTime'][jj])
+                            tx[ii]['ToStartTime'][jj] = to_hex_if_datestring(tx[ii]['ToStartTime'][jj], now)
                 if 'ToEndTime' not in tx[ii]:
                     tx[ii]['ToEndTime'] = []
                     for jj in range(nToAsset):
@@ -204,7 +208,7 @@ def buildMakeMultiSwapTx(transaction, defaultChainId):
                         raise ValueError('In buildMakeMultiSwapTx, ToEndTime list is not the same length as ToAssetID')
                     else:
                         for jj in range(nToAsset):
-                            tx[ii]['ToEndTime'][jj] = to_hex_if_datestring(tx[ii]['ToEndTime'][jj])
+                            tx[ii]['ToEndTime'][jj] = to_hex_if_datestring(tx[ii]['ToEndTime'][jj], now)
             
                 if 'MinToAmount' not in tx[ii]:
                     raise ValueError('In buildMakeMultiSwapTx, could not find MinToAmount in tx')
@@ -226,7 +230,7 @@ def buildMakeMultiSwapTx(transaction, defaultChainId):
                 if 'FromStartTime' not in tx[ii]:
                     tx[ii]['FromStartTime'] = []
                     for jj in range(nFromAsset):
-                        tx[ii]['FromStartTime'].append(to_hex_if_datestring('now'))
+                        tx[ii]['FromStartTime'].append(to_hex_if_datestring('now', now))
                 else:
                     if not isinstance(tx[ii]['FromStartTime'], list):
                         raise ValueError('In buildMakeMultiSwapTx, FromStartTime is not a list')
@@ -234,7 +238,7 @@ def buildMakeMultiSwapTx(transaction, defaultChainId):
                         raise ValueError('In buildMakeMultiSwapTx, FromStartTime list is not the same length as FromAssetID')
                     else:
                         for jj in range(nFromAsset):
-                            tx[ii]['FromStartTime'][jj] = to_hex_if_datestring(tx[ii]['FromStartTime'][jj])
+                            tx[ii]['FromStartTime'][jj] = to_hex_if_datestring(tx[ii]['FromStartTime'][jj], now)
                     
                 if 'FromEndTime' not in tx[ii]:
                     tx[ii]['FromEndTime'] = []
@@ -247,7 +251,7 @@ def buildMakeMultiSwapTx(transaction, defaultChainId):
                         raise ValueError('In buildMakeMultiSwapTx, FromEndTime list is not the same length as FromAssetID')
                     else:
                         for jj in range(nFromAsset):
-                            tx[ii]['FromEndTime'][jj] = to_hex_if_datestring(tx[ii]['FromEndTime'][jj])
+                            tx[ii]['FromEndTime'][jj] = to_hex_if_datestring(tx[ii]['FromEndTime'][jj], now)
             
                 if 'MinFromAmount' not in tx[ii]:
                     raise ValueError('In buildMakeMultiSwapTx, could not find MinFromAmount in tx')
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+#
+"""
+    Ticket logs. Decodes the logs written to the ticket log address, keeps a table of the live
+    tickets up to date from them instead of reading allTickets on every block, and streams them
+    as they are mined.
+"""
+#
+#
+import json
+import queue
+import bisect
+import asyncio
+import threading
+from collections import (
+    namedtuple,
+)
+
+import websockets
+from web3 import WebsocketProvider
+
+from .fsn_utils import (
+    hex2a,
+    to_integer,
+    to_hex_if_bytes,
+)
+from .fsn_records import (
+    Ticket,
+)
+from .fsn_ingest import (
+    BatchRpc,
+    BuyTicket,
+)
+
+
+TICKET_LOG_KINDS = ['ticketSelected', 'ticketReturn', 'ticketExpired']
+
+MAX_BACKOFF = 60            # Longest wait in seconds between retries after a connection error
+
+BUY_TICKET_TOPIC = '0x0000000000000000000000000000000000000000000000000000000000000004'    # Fusion call logs carry the call number, BuyTicketFunc is 4
+
+TICKET_ID_KEYS = ['TicketID', 'TicketId', 'Ticket', 'Id']
+
+TICKET_LIST_KEYS = ['Tickets', 'TicketIDs', 'TicketIds']
+
+OWNER_KEYS = ['TicketOwner', 'Owner']
+
+
+TicketEvent = namedtuple('TicketEvent', ['kind', 'ticketId', 'owner', 'blockNumber', 'blockHash', 'txHash',
+                                         'logIndex', 'removed', 'data'])
+
+
+def ticketLogTopics(consts):
+    #
+    # {topic: kind} of the ticket logs, from Fsn.consts
+    #
+    return {consts['TicketLogAddress_Topic_' + kind].lower(): kind for kind in TICKET_LOG_KINDS}
+
+
+def ticketLogFilter(consts):
+    return {'address': consts['TicketLogAddress'], 'topics': [list(ticketLogTopics(consts))]}
+
+
+def decodeTicketLog(log, topics):
+    #
+    # Returns a list of TicketEvent, one per ticket named in the log's JSON data. topics is ticketLogTopics(consts)
+    #
+    topic = to_hex_if_bytes(log['topics'][0]).lower()
+    kind = topics.get(topic)
+    if kind is None:
+        return []
+    try:
+        data = hex2a(to_hex_if_bytes(log['data']))
+    except (ValueError, TypeError):
+        data = {}
+
+    ids = [data[key] for key in TICKET_ID_KEYS if data.get(key)]
+    for key in TICKET_LIST_KEYS:
+        if isinstance(data.get(key), list):
+            ids.extend(data[key])
+    owner = next((data[key] for key in OWNER_KEYS if data.get(key)), None)
+    if not ids:
+        ids = [None]
+
+    return [
+        TicketEvent(
+            kind, None if ticketId is None else ticketId.lower(), owner, to_integer(log.get('blockNumber')),
+            to_hex_if_bytes(log.get('blockHash')), to_hex_if_bytes(log.get('transactionHash')),
+            to_integer(log.get('logIndex')), bool(log.get('removed')), data,
+        )
+        for ticketId in ids
+    ]
+
+
+class TicketTracker:
+    """
+    The live tickets, loaded once with allTickets and then brought forward block range by block range.
+
+    update() reads the ticketSelected, ticketReturn and ticketExpired logs of the new blocks and removes
+    those tickets. Buyers are found from the logs of BuyTicket calls (or from BuyTicket events when the
+    tracker is a BlockIngester sink), and their tickets are read again with allTicketsByAddress.
+
+    Tickets are indexed by owner and by expiry time. Callbacks registered with onChange are called with
+    (kind, ticket), where kind is 'add', 'ticketSelected', 'ticketReturn', 'ticketExpired' or 'remove'.
+    """
+
+    def __init__(self, fsn):
+        self.fsn = fsn
+        self.rpc = BatchRpc(fsn.web3)
+        self.topics = ticketLogTopics(fsn.consts)
+        self.lastBlock = None
+        self._tickets = {}
+        self._byOwner = {}
+        self._byExpiry = []
+        self._buyers = set()
+        self._callbacks = []
+        self._lock = threading.RLock()
+
+
+    def onChange(self, callback):
+        self._callbacks.append(callback)
+
+
+    def _notify(self, kind, ticket):
+        for callback in self._callbacks:
+            callback(kind, ticket)
+
+
+    def _add(self, ticket):
+        self._tickets[ticket.ID] = ticket
+        self._byOwner.setdefault(ticket.Owner, set()).add(ticket.ID)
+        bisect.insort(self._byExpiry, (ticket.ExpireTime, ticket.ID))
+
+
+    def _remove(self, ticketId):
+        ticket = self._tickets.pop(ticketId, None)
+        if ticket is None:
+            return None
+        owned = self._byOwner.get(ticket.Owner)
+        if owned is not None:
+            owned.discard(ticketId)
+            if not owned:
+                del self._byOwner[ticket.Owner]
+        key = (ticket.ExpireTime, ticketId)
+        ii = bisect.bisect_left(self._byExpiry, key)
+        if ii < len(self._byExpiry) and self._byExpiry[ii] == key:
+            del self._byExpiry[ii]
+        return ticket
+
+
+    def _ticket(self, ticketId, info, owner=None):
+        ticket = Ticket(
+            Owner=(owner or info['Owner']).lower(), Height=to_integer(info.get('Height')),
+            StartTime=to_integer(info.get('StartTime')), ExpireTime=to_integer(info.get('ExpireTime')),
+        )
+        ticket.ID = ticketId.lower()
+        return ticket
+
+
+    def sync(self, block='latest'):
+        #
+        # Load a full snapshot of allTickets. Differences from the current table are reported to the callbacks
+        #
+        if block == 'latest':
+            block = to_integer(self.fsn.web3.manager.request_blocking('eth_blockNumber', []))
+        snapshot = self.fsn.allTickets(hex(block))
+        tickets = {ticket.ID: ticket for ticket in
+                   (self._ticket(ticketId, info) for ticketId, info in dict(snapshot or {}).items())}
+        with self._lock:
+            removed = [self._remove(ticketId) for ticketId in list(self._tickets) if ticketId not in tickets]
+            added = [ticket for ticketId, ticket in tickets.items() if self._tickets.get(ticketId) != ticket]
+            for ticket in added:
+                self._remove(ticket.ID)
+                self._add(ticket)
+            self._buyers = set()
+            self.lastBlock = block
+        for ticket in removed:
+            self._notify('remove', ticket)
+        for ticket in added:
+            self._notify('add', ticket)
+        return block
+
+
+    def rollback(self, height):
+        #
+        # Called by a BlockFollower after a reorganisation: reload the tickets as they were at height
+        #
+        if self.lastBlock is not None and self.lastBlock > height:
+            self.sync(height)
+
+
+    def update(self, toBlock='latest'):
+        #
+        # Apply the ticket changes of blocks lastBlock+1 to toBlock. Returns toBlock
+        #
+        if self.lastBlock is None:
+            return self.sync(toBlock)
+        if toBlock == 'latest':
+            toBlock = to_integer(self.fsn.web3.manager.request_blocking('eth_blockNumber', []))
+        if toBlock <= self.lastBlock:
+            return self.lastBlock
+
+        blockRange = {'fromBlock': hex(self.lastBlock + 1), 'toBlock': hex(toBlock)}
+        ticketLogs, buyLogs = self.rpc.call([
+            ('eth_getLogs', [dict(blockRange, **ticketLogFilter(self.fsn.consts))]),
+            ('eth_getLogs', [dict(blockRange, address=self.fsn.consts['FSNCallAddress'], topics=[BUY_TICKET_TOPIC])]),
+        ])
+
+        events = []
+        for log in ticketLogs:
+            events.extend(decodeTicketLog(log, self.topics))
+
+        buyTxs = sorted({to_hex_if_bytes(log['transactionHash']) for log in buyLogs})
+        buyers = set(tx['from'].lower() for tx in
+                     self.rpc.call([('eth_getTransactionByHash', [txHash]) for txHash in buyTxs]) if tx is not None)
+        with self._lock:
+            buyers |= self._buyers
+            self._buyers = set()
+        buyers = sorted(buyers)
+        owned = self.rpc.call([('fsn_allTicketsByAddress', [owner, hex(toBlock)]) for owner in buyers])
+
+        changes = []
+        with self._lock:
+            for event in events:
+                if event.ticketId is not None and not event.removed:
+                    ticket = self._remove(event.ticketId)
+                    if ticket is not None:
+                        changes.append((event.kind, ticket))
+            for owner, tickets in zip(buyers, owned):
+                tickets = dict(tickets or {})
+                for ticketId in list(self._byOwner.get(owner, ())):
+                    if ticketId not in tickets:
+                        changes.append(('remove', self._remove(ticketId)))
+                for ticketId, info in tickets.items():
+                    ticket = self._ticket(ticketId, info, owner)
+                    if self._tickets.get(ticket.ID) != ticket:
+                        self._remove(ticket.ID)
+                        self._add(ticket)
+                        changes.append(('add', ticket))
+            self.lastBlock = toBlock
+        for kind, ticket in changes:
+            self._notify(kind, ticket)
+        return toBlock
+
+
+    def apply(self, event):
+        #
+        # As a BlockIngester sink: remember the buyers, whose tickets are read on the next update()
+        #
+        if isinstance(event, BuyTicket):
+            with self._lock:
+                self._buyers.add(event.sender.lower())
+
+    __call__ = apply
+
+
+    def get(self, ticketId):
+        return self._tickets.get(ticketId.lower())
+
+
+    def ticketsOf(self, owner):
+        with self._lock:
+            return [self._tickets[ticketId] for ticketId in self._byOwner.get(owner.lower(), ())]
+
+
+    def countOf(self, owner):
+        return len(self._byOwner.get(owner.lower(), ()))
+
+
+    def expiringBefore(self, t):
+        with self._lock:
+            return [self._tickets[ticketId] for expireTime, ticketId in
+                    self._byExpiry[:bisect.bisect_left(self._byExpiry, (t, ''))]]
+
+
+    def owners(self):
+        with self._lock:
+            return {owner: len(ids) for owner, ids in self._byOwner.items()}
+
+
+    def __contains__(self, ticketId):
+        return ticketId.lower() in self._tickets
+
+
+    def __len__(self):
+        return len(self._tickets)
+
+
+class TicketEventStream:
+    """
+    A live stream of decoded ticket events. With a WebSocket provider the node pushes the logs
+    (eth_subscribe 'logs'), otherwise a log filter is polled with eth_getFilterChanges.
+
+    Events can be restricted to some owners and kinds inside the client, so one stream can serve many
+    staking nodes. Logs that do not name the owner of a ticket are given the owner known to 'tracker'
+    (a TicketTracker), if one is passed.
+
+    Iterate over the stream, or pass a callback, which is then called from the stream's thread.
+    Connection errors are retried with a growing delay and kept in lastError. If the stream's thread
+    stops on any other error, iteration ends by raising that error.
+    """
+
+    def __init__(self, fsn, owners=None, kinds=None, callback=None, poll_interval=2.0, tracker=None):
+        self.fsn = fsn
+        self.owners = None if owners is None else {owner.lower() for owner in owners}
+        self.kinds = None if kinds is None else set(kinds)
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.tracker = tracker
+        self.topics = ticketLogTopics(fsn.consts)
+        self.lastError = None
+        self._failed = None
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._filterId = None
+
+
+    def logFilter(self):
+        return ticketLogFilter(self.fsn.consts)
+
+
+    def start(self):
+        if isinstance(self.fsn.web3.provider, WebsocketProvider):
+            target = self._runWebSocket
+        else:
+            target = self._poll
+        self._thread = threading.Thread(target=self._run, args=(target,), name='TicketEventStream', daemon=True)
+        self._thread.start()
+        return self
+
+
+    def close(self):
+        self._stop.set()
+        self._queue.put(None)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.poll_interval + 1)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __iter__(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                if self._failed is not None:
+                    raise self._failed
+                return
+            yield event
+
+
+    def _run(self, target):
+        #
+        # Whatever stops the thread, wake up the iterators
+        #
+        try:
+            target()
+        except Exception as e:
+            self.lastError = e
+            self._failed = e
+        finally:
+            self._queue.put(None)
+
+
+    def _deliver(self, log):
+        for event in decodeTicketLog(log, self.topics):
+            if event.owner is None and self.tracker is not None and event.ticketId is not None:
+                ticket = self.tracker.get(event.ticketId)
+                if ticket is not None:
+                    event = event._replace(owner=ticket.Owner)
+            if self.kinds is not None and event.kind not in self.kinds:
+                continue
+            if self.owners is not None and (event.owner is None or event.owner.lower() not in self.owners):
+                continue
+            if self.callback is not None:
+                self.callback(event)
+            else:
+                self._queue.put(event)
+
+
+    def _poll(self):
+        manager = self.fsn.web3.manager
+        wait = self.poll_interval
+        while not self._stop.is_set():
+            try:
+                if self._filterId is None:
+                    self._filterId = manager.request_blocking('eth_newFilter', [self.logFilter()])
+                for log in manager.request_blocking('eth_getFilterChanges', [self._filterId]):
+                    self._deliver(log)
+                wait = self.poll_interval
+            except ValueError as e:
+                #
+                # The node drops filters that are not polled for a while. Make a new one
+                #
+                self.lastError = e
+                self._filterId = None
+            except OSError as e:
+                #
+                # Connection errors and timeouts (requests' exceptions are OSErrors). Keep the filter
+                # and retry, waiting longer each time
+                #
+                self.lastError = e
+                wait = min(max(2*wait, 1), MAX_BACKOFF)
+            self._stop.wait(wait)
+        if self._filterId is not None:
+            try:
+                manager.request_blocking('eth_uninstallFilter', [self._filterId])
+            except (ValueError, OSError):
+                pass
+
+
+    def _runWebSocket(self):
+        asyncio.run(self._webSocket())
+
+
+    async def _webSocket(self):
+        provider = self.fsn.web3.provider
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(provider.endpoint_uri) as ws:
+                    await ws.send(json.dumps({
+                        'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['logs', self.logFilter()],
+                    }))
+                    reply = json.loads(await ws.recv())
+                    if 'error' in reply:
+                        raise ValueError('Error in TicketEventStream: ', reply['error'])
+                    while not self._stop.is_set():
+                        try:
+                            message = json.loads(await asyncio.wait_for(ws.recv(), self.poll_interval))
+                        except asyncio.TimeoutError:
+                            continue
+                        if message.get('method') == 'eth_subscription':
+                            self._deliver(message['params']['result'])
+            except (OSError, ValueError, websockets.exceptions.WebSocketException) as e:
+                #
+                # Reconnect after a dropped connection. Logs mined in between are not replayed
+                #
+                self.lastError = e
+                await asyncio.sleep(self.poll_interval)
@@ -52,31 +52,91 @@ from web3.datastructures import (
 from .fsn_utils import *
         
 
-from datetime import datetime, timedelta
-from dateutil import tz
+import re
+import time
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+DATE_CACHE_SIZE = 4096
+
+_DATE_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.\d+)?(Z|[+-]\d\d:?\d\d)?$')
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def dateStringToDatetime(datestring):
 #
 # Example of valid dates 
 #"2007-03-01T13:00:00+0100"  or  UTC = "2007-03-01T12:00:00" or UTC = "2019-09-18T19:29:05.000Z"
+#
+# Parsed with a regular expression rather than strptime, and remembered, as the same few dates
+# are used over and over in time lock and swap transactions. Fractions of a second are dropped
     
-    if len(datestring) == 19 or datestring[23] == 'Z':
-        datestring = datestring + '+0000'          # Assume the user meant UTC
-        
+    match = _DATE_RE.match(datestring)
+    if match is None:
+        raise ValueError('Error in dateStringToDatetime: unrecognised date ', datestring)
+    year, month, day, hour, minute, second, zone = match.groups()
     
-    try:
-        dt = datetime.strptime(datestring, '%Y-%m-%dT%H:%M:%S%z')
-    except ValueError as ve:
-            print('ValueError: ', ve, ' in string ',datestring)
-            
-    return dt
+    if zone is None or zone == 'Z':
+        tzinfo = timezone.utc                      # Assume the user meant UTC
+    else:
+        offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[-2:]))
+        tzinfo = timezone(-offset if zone[0] == '-' else offset)
+        
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), tzinfo=tzinfo)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def dateStringToHex(datestring):
+    return datetimeToHex(dateStringToDatetime(datestring))
+
+
+def referenceTime(now=None):
+#
+# The time to use for 'now', as seconds since 1970. now may be None (the current time), a timezone enabled
+# datetime, or a number of seconds as an int or hex string. Pass the same now to every build of a batch
+# of transactions so they all agree
+#
+    if now is None:
+        return int(time.time())
+    if isinstance(now, datetime):
+        return int((now - EPOCH).total_seconds())
+    if isinstance(now, str):
+        return int(now, 16) if now[:2] in ('0x', '0X') else int(now)
+    return int(now)
+
+
+def resolveNow(transaction, keys, now=None):
+#
+# Replace every 'now' in the given keys of transaction (or in lists under them) by one reference time
+#
+    nowHex = None
+    for key in keys:
+        value = transaction.get(key)
+        if isinstance(value, list):
+            isNow = any(v in ('now', 'Now') for v in value)
+        else:
+            isNow = value in ('now', 'Now')
+        if not isNow:
+            continue
+        if nowHex is None:
+            nowHex = hex(referenceTime(now))
+        if isinstance(value, list):
+            transaction[key] = [nowHex if v in ('now', 'Now') else v for v in value]
+        else:
+            transaction[key] = nowHex
+    return transaction
 
 
 def datetimeToHex(dt):
-    tzero = datetime.strptime('1970-01-01T00:00:00+0000', '%Y-%m-%dT%H:%M:%S%z')
-    tdelta = (dt - tzero).total_seconds()
+    tdelta = (dt - EPOCH).total_seconds()
     tdelta = int(tdelta)
     #print('tdelta = ',tdelta)
     
@@ -84,7 +144,6 @@ def datetimeToHex(dt):
 
 
 def numToDatetime(tdelta):
-    tzero = datetime.strptime('1970-01-01T00:00:00+0000', '%Y-%m-%dT%H:%M:%S%z')
     if is_integer(tdelta):
         pass
     elif is_hex(tdelta):
@@ -95,24 +154,64 @@ def numToDatetime(tdelta):
             'Unrecognised raw date ', tdelta
         )
     
-    return tzero + timedelta(seconds = tdelta)
+    return EPOCH + timedelta(seconds = tdelta)
+
+
+def numsToDatetimes(times, forever='infinity'):
+    #
+    # Bulk numToDatetime for a list of times (ints or hex strings). Times of TIME_FOREVER or more become 'forever'
+    #
+    result = []
+    append = result.append
+    fromtimestamp = datetime.fromtimestamp
+    utc = timezone.utc
+    for t in times:
+        t = to_integer(t)
+        append(forever if t >= TIME_FOREVER else fromtimestamp(t, utc))
+    return result
+
+
+def numsToDatetime64(times):
+    #
+    # The same as a NumPy datetime64[s] array, with NaT for forever
+    #
+    if np is None:
+        raise ImportError('numpy is required for datetime64 arrays, use numsToDatetimes instead')
+    if not isinstance(times, np.ndarray):
+        times = [to_integer(t) for t in times]
+    seconds = np.asarray(times, dtype=np.uint64)
+    result = seconds.astype(np.int64).view('datetime64[s]')
+    result[seconds >= np.uint64(TIME_FOREVER)] = np.datetime64('NaT')
+    return result
+
+
+def timeLockItemsToDatetimes(items, numpy=None):
+    #
+    # Converts the StartTime and EndTime of a whole Items list of a time lock balance at once.
+    # Returns (startTimes, endTimes), as datetime64 arrays if numpy (the default when NumPy is installed),
+    # otherwise as lists of datetimes. An EndTime of forever is NaT in an array, 'infinity' in a list
+    #
+    starts = [item['StartTime'] for item in items]
+    ends = [item['EndTime'] for item in items]
+    if numpy is None:
+        numpy = np is not None
+    if numpy:
+        return numsToDatetime64(starts), numsToDatetime64(ends)
+    return numsToDatetimes(starts), numsToDatetimes(ends)
 
 
 
 
 
 @curry
-def to_hex_if_datestring(datestring):
+def to_hex_if_datestring(datestring, now=None):
 #
-    tzlocal = tz.tzoffset('UTC', 0)
     if datestring == 'now' or datestring == 'Now':
-        return datetimeToHex(datetime.now(tzlocal))  # Make sure that stored times are in UTC, with timezone included
+        return hex(referenceTime(now))              # Stored times are seconds since 1970 UTC
     elif datestring == 'infinity' or datestring == 'Infinity':
         return '0xffffffffffffffff'
     elif datestring[0:2] != '0x':
-        dt = dateStringToDatetime(datestring)
-        #print('dt = ',dt)
-        return datetimeToHex(dt)
+        return dateStringToHex(datestring)
     else:
         return datestring
     
@@ -168,7 +267,7 @@ REQUIRED_ASSETTOTL_PARAMS = [
 ]
 
 
-def buildAssetToTimeLockTx(transaction, defaultChainId):
+def buildAssetToTimeLockTx(transaction, defaultChainId, now=None):
     defaults = {}
     alreadygot = {}
     for key, default_val in ASSETTOTL_DEFAULTS.items():
@@ -180,6 +279,7 @@ def buildAssetToTimeLockTx(transaction, defaultChainId):
             
     transaction_merged = merge(defaults, alreadygot)
     transaction_merged['chainId'] = defaultChainId
+    transaction_merged = resolveNow(transaction_merged, ['start', 'end'], now)
     transaction_new = unsigned_assettotl_formatter(transaction_merged)
     
     assert_check_assettotl_params(transaction_new)
@@ -211,7 +311,7 @@ TLTOASSET_FORMATTERS = ASSETTOTL_FORMATTERS
 VALID_TLTOASSET_PARAMS = VALID_ASSETTOTL_PARAMS
 REQUIRED_TLTOASSET_PARAMS = REQUIRED_ASSETTOTL_PARAMS
 
-def buildTimeLockToAssetTx(transaction, defaultChainId):
+def buildTimeLockToAssetTx(transaction, defaultChainId, now=None):
     defaults = {}
     alreadygot = {}
     for key, default_val in TLTOASSET_DEFAULTS.items():
@@ -223,6 +323,7 @@ def buildTimeLockToAssetTx(transaction, defaultChainId):
             
     transaction_merged = merge(defaults, alreadygot)
     transaction_merged['chainId'] = defaultChainId
+    transaction_merged = resolveNow(transaction_merged, ['start', 'end'], now)
     transaction_new = unsigned_tltoasset_formatter(transaction_merged)
     
     assert_check_tltoasset_params(transaction_new)
@@ -294,7 +395,7 @@ REQUIRED_TLTOTL_PARAMS = [
 ]
 
 
-def buildTimeLockToTimeLockTx(transaction, defaultChainId):
+def buildTimeLockToTimeLockTx(transaction, defaultChainId, now=None):
     defaults = {}
     alreadygot = {}
     for key, default_val in TLTOTL_DEFAULTS.items():
@@ -306,6 +407,7 @@ def buildTimeLockToTimeLockTx(transaction, defaultChainId):
             
     transaction_merged = merge(defaults, alreadygot)
     transaction_merged['chainId'] = defaultChainId
+    transaction_merged = resolveNow(transaction_merged, ['start', 'end'], now)
     transaction_new = unsigned_tltotl_formatter(transaction_merged)
     
     assert_check_tltotl_params(transaction_new)
@@ -380,7 +482,7 @@ REQUIRED_SENDTOTL_PARAMS = [
 ]
 
 
-def buildSendToTimeLockTx(transaction, defaultChainId):
+def buildSendToTimeLockTx(transaction, defaultChainId, now=None):
     defaults = {}
     alreadygot = {}
     for key, default_val in SENDTOTL_DEFAULTS.items():
@@ -392,6 +494,7 @@ def buildSendToTimeLockTx(transaction, defaultChainId):
             
     transaction_merged = merge(defaults, alreadygot)
     transaction_merged['chainId'] = defaultChainId
+    transaction_merged = resolveNow(transaction_merged, ['start', 'end'], now)
     transaction_new = unsigned_sendtotl_formatter(transaction_merged)
     
     assert_check_sendtotl_params(transaction_new)
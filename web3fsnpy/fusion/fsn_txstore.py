@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+#
+"""
+    Local transaction store. Keeps the transactions served by Fusion's api in an SQLite file,
+    indexed by Fusion command, address, asset id and height, and updates it incrementally.
+"""
+#
+#
+import os
+import json
+import sqlite3
+import threading
+
+from .fsn_utils import (
+    to_integer,
+)
+from .fsn_crawler import (
+    TX_PAGE_SIZE,
+    iterContiguousPages,
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    hash        TEXT PRIMARY KEY,
+    height      INTEGER NOT NULL,
+    timestamp   INTEGER,
+    command     TEXT,
+    from_addr   TEXT,
+    to_addr     TEXT,
+    tx          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_height ON transactions (height);
+CREATE INDEX IF NOT EXISTS transactions_command ON transactions (command, height);
+
+CREATE TABLE IF NOT EXISTS tx_addresses (
+    address     TEXT NOT NULL,
+    height      INTEGER NOT NULL,
+    hash        TEXT NOT NULL,
+    PRIMARY KEY (address, height, hash)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tx_assets (
+    asset_id    TEXT NOT NULL,
+    height      INTEGER NOT NULL,
+    hash        TEXT NOT NULL,
+    PRIMARY KEY (asset_id, height, hash)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value       TEXT
+);
+"""
+
+ADDRESS_KEYS = ['fromAddress', 'toAddress', 'from', 'to']
+
+DATA_ADDRESS_KEYS = ['To', 'Owner']
+
+ASSET_KEYS = ['asset', 'AssetID', 'FromAssetID', 'ToAssetID']
+
+
+def defaultStorePath(network):
+    return os.path.join(os.path.expanduser('~'), '.web3fsnpy', 'transactions-{}.sqlite'.format(network))
+
+
+def _txData(tx):
+    data = tx.get('data')
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _values(source, keys):
+    #
+    # Fields may hold one value or a list of them, as in a multi swap
+    #
+    for key in keys:
+        value = source.get(key)
+        if isinstance(value, list):
+            yield from value
+        elif value:
+            yield value
+
+
+def _lower(values):
+    return {v.lower() for v in values if isinstance(v, str) and v}
+
+
+class TransactionStore:
+    """
+    Indexed local copy of the 'transactions/all' history of the api.
+
+    Transactions are added from api pages (sync(), or addTransactions() with any rows in the api's
+    format, e.g. from crawlTransactions). Queries by command, address, asset id and height range are
+    answered by SQLite indexes without any network access.
+    """
+
+    def __init__(self, api=None, path=None, noTickets=True):
+        self.api = api
+        if path is None:
+            path = defaultStorePath(api.network)
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.noTickets = noTickets
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+    def addTransactions(self, txs):
+        #
+        # Returns the number of transactions that were not already in the store
+        #
+        rows = []
+        addresses = []
+        assets = []
+        for tx in txs:
+            if not isinstance(tx, dict) or 'hash' not in tx:
+                continue
+            txHash = tx['hash'].lower()
+            height = to_integer(tx['height'])
+            data = _txData(tx)
+            rows.append((
+                txHash, height, to_integer(tx.get('timeStamp')), tx.get('fusionCommand'),
+                (tx.get('fromAddress') or tx.get('from') or '').lower() or None,
+                (tx.get('toAddress') or tx.get('to') or '').lower() or None,
+                json.dumps(tx),
+            ))
+            for address in _lower(_values(tx, ADDRESS_KEYS)) | _lower(_values(data, DATA_ADDRESS_KEYS)):
+                addresses.append((address, height, txHash))
+            for assetId in _lower(_values(tx, ASSET_KEYS)) | _lower(_values(data, ASSET_KEYS)):
+                assets.append((assetId, height, txHash))
+
+        with self._lock:
+            with self._db:
+                before = self._db.total_changes
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO transactions (hash, height, timestamp, command, from_addr, to_addr, tx) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows,
+                )
+                added = self._db.total_changes - before
+                self._db.executemany('INSERT OR IGNORE INTO tx_addresses VALUES (?, ?, ?)', addresses)
+                self._db.executemany('INSERT OR IGNORE INTO tx_assets VALUES (?, ?, ?)', assets)
+        return added
+
+
+    def sync(self, workers=4):
+        #
+        # Reads the api's pages from the most recent, 'workers' at a time. Once the history has been read
+        # to the end, the walk stops at the first page that holds nothing new. Returns the number of new
+        # transactions.
+        #
+        if self.noTickets:
+            fetch = self.api.transactionNoTicketsDesc
+        else:
+            fetch = self.api.transactionsDesc
+
+        complete = self._getMeta('complete') == '1'
+        added = 0
+        pages = iterContiguousPages(self.api, fetch, TX_PAGE_SIZE, prefetch=workers, workers=workers)
+        try:
+            for pageNo, rows in pages:
+                fresh = self.addTransactions(rows)
+                added += fresh
+                if len(rows) < TX_PAGE_SIZE:
+                    complete = True
+                    break
+                if complete and fresh == 0:
+                    break
+        finally:
+            pages.close()
+
+        with self._lock:
+            with self._db:
+                self._setMeta('complete', '1' if complete else '0')
+        return added
+
+
+    def _getMeta(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+
+    def _setMeta(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+
+    def query(self, command=None, address=None, assetId=None, fromHeight=None, toHeight=None, limit=None, desc=True):
+        #
+        # All the given conditions must match, command may also be a list of commands.
+        # Returns the transactions in the api's format, ordered by height
+        #
+        sql = 'SELECT t.tx FROM transactions t'
+        where = []
+        params = []
+        if address is not None:
+            sql += ' JOIN tx_addresses a ON a.hash = t.hash'
+            where.append('a.address = ?')
+            params.append(address.lower())
+        if assetId is not None:
+            sql += ' JOIN tx_assets s ON s.hash = t.hash'
+            where.append('s.asset_id = ?')
+            params.append(assetId.lower())
+        if isinstance(command, str):
+            where.append('t.command = ?')
+            params.append(command)
+        elif command is not None:
+            where.append('t.command IN ({})'.format(', '.join('?'*len(command))))
+            params.extend(command)
+        if fromHeight is not None:
+            where.append('t.height >= ?')
+            params.append(fromHeight)
+        if toHeight is not None:
+            where.append('t.height <= ?')
+            params.append(toHeight)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY t.height {0}, t.hash {0}'.format('DESC' if desc else 'ASC')
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            return [json.loads(tx) for tx, in self._db.execute(sql, params)]
+
+
+    def takeSwaps(self, assetId=None, fromHeight=None, limit=None):
+        return self.query(['TakeSwapFunc', 'TakeMultiSwapFunc'], assetId=assetId, fromHeight=fromHeight, limit=limit)
+
+
+    def lastHeight(self):
+        with self._lock:
+            return self._db.execute('SELECT MAX(height) FROM transactions').fetchone()[0]
+
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
@@ -12,7 +12,7 @@ from cytoolz import (
 
 import rlp
 
-from eth_account import (
+from ..eth_account import (
     Account,
 )
 
@@ -257,6 +257,26 @@ def to_0hex(v):
     return s
 
 
+TIME_FOREVER = 0xffffffffffffffff       # consts['BN'], a time lock EndTime of forever and the largest uint64
+
+
+def to_integer(value):
+    #
+    # Numbers from the node or the api, which may be ints, hex or decimal strings, or None
+    #
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return hex_to_integer(value) if value[:2] in ('0x', '0X') else int(value)
+    return int(value)
+
+
+def to_hex_if_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return value
+
+
 
 def hex2a(datastr):
     
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+#
+"""
+    Vesting schedules: recipients and tranches expanded into time locked sends, built in batches,
+    signed in parallel and submitted with sequential nonces. Schedules are JSON files and every
+    tranche is appended to a journal with its signed transaction before it is submitted, so a run that
+    stops part way can be replayed without paying a tranche twice.
+"""
+#
+#
+import os
+import json
+from collections import (
+    namedtuple,
+)
+from concurrent.futures import ProcessPoolExecutor
+
+from ..eth_account import (
+    Account,
+)
+
+from .fsn_utils import (
+    to_integer,
+)
+from .fsn_ingest import (
+    BatchRpc,
+)
+from .fsn_timelocks import (
+    buildSendToTimeLockTx,
+    to_hex_if_datestring,
+)
+from .fsn_transactions import (
+    SignTx,
+)
+
+
+SCHEDULE_VERSION = 1
+
+
+Tranche = namedtuple('Tranche', ['index', 'to', 'value', 'startTime', 'endTime'])
+
+
+def _time(value):
+    #
+    # Seconds since 1970 from an int, a hex string, a date string, 'now' or 'infinity'
+    #
+    if isinstance(value, int):
+        return value
+    return int(to_hex_if_datestring(value), 16)
+
+
+class VestingSchedule:
+    """
+    Each recipient's value is split into 'count' tranches. Tranche k is time locked to the recipient from
+    start + cliff + k*period until 'end' (forever by default), so it becomes usable as it vests. Any
+    remainder of the division goes in the last tranche, so each recipient receives exactly their value.
+
+    recipients is a list of {'to': address, 'value': amount in the asset's smallest unit}. Times are seconds
+    since 1970, or date strings as used by sendRawTimeLock.
+    """
+
+    def __init__(self, asset, recipients, start, cliff=0, period=2592000, count=1, end='infinity', sender=None):
+        if count < 1:
+            raise ValueError('Error in VestingSchedule: count must be at least 1')
+        self.asset = asset
+        self.recipients = [{'to': r['to'], 'value': to_integer(r['value'])} for r in recipients]
+        self.start = _time(start)
+        self.cliff = int(cliff)
+        self.period = int(period)
+        self.count = int(count)
+        self.end = _time(end)
+        self.sender = sender
+
+
+    def tranches(self):
+        index = 0
+        for recipient in self.recipients:
+            value = recipient['value']
+            share = value // self.count
+            for k in range(self.count):
+                trancheValue = share if k < self.count - 1 else value - share*(self.count - 1)
+                startTime = self.start + self.cliff + k*self.period
+                yield Tranche(index, recipient['to'], trancheValue, startTime, max(self.end, startTime))
+                index += 1
+
+
+    def __len__(self):
+        return len(self.recipients)*self.count
+
+
+    def toDict(self):
+        return {
+            'version':      SCHEDULE_VERSION,
+            'asset':        self.asset,
+            'sender':       self.sender,
+            'start':        self.start,
+            'cliff':        self.cliff,
+            'period':       self.period,
+            'count':        self.count,
+            'end':          self.end,
+            'recipients':   [{'to': r['to'], 'value': str(r['value'])} for r in self.recipients],
+        }
+
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.toDict(), f, indent=1)
+        os.replace(tmp, path)
+
+
+    @classmethod
+    def fromDict(cls, d):
+        if d.get('version') != SCHEDULE_VERSION:
+            raise ValueError('Error in VestingSchedule: unknown schedule version ', d.get('version'))
+        return cls(d['asset'], d['recipients'], d['start'], d['cliff'], d['period'], d['count'], d['end'], d.get('sender'))
+
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.fromDict(json.load(f))
+
+
+def readJournal(path):
+    #
+    # {tranche index: journal entry} of the tranches signed so far. A tranche is written once with its
+    # nonce and signed transaction (rawTx) before it is sent, and again with its txHash once the node
+    # has accepted it. The entries of a tranche are merged, so only those that were sent have a txHash
+    #
+    done = {}
+    if path is None or not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                done.setdefault(entry['index'], {}).update(entry)
+    return done
+
+
+def _jsonable(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, dict):
+        return {key: _jsonable(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+_signer = None
+
+
+def _initSigner(key):
+    global _signer
+    _signer = Account.from_key(key)
+
+
+def _sign(Tx_dict):
+    return SignTx(Tx_dict, _signer)
+
+
+class VestingDistributor:
+    """
+    Sends the tranches of a schedule that are not yet in the journal. The unsigned transactions are built
+    by the node (fsntx_buildSendTimeLockTx) in JSON-RPC batches of batch_size, signed by 'workers' processes,
+    then sent one by one in nonce order. Each tranche is journalled with its nonce and signed transaction
+    before it is sent, and with its txHash after. progress(done, total, tranche, txHash) is called after each one.
+
+    A tranche journalled without a txHash may or may not have reached the node, e.g. if the send timed out.
+    On a replay its recorded transaction is sent again with its recorded nonce, so it can only be paid once.
+    """
+
+    def __init__(self, fsn, schedule, account, chainId, journal=None, workers=4, batch_size=50,
+                 gasPrice=None, gas=None, progress=None):
+        self.fsn = fsn
+        self.schedule = schedule
+        self.account = account
+        self.chainId = chainId
+        self.journal = journal
+        self.workers = workers
+        self.batch_size = batch_size
+        self.gasPrice = gasPrice
+        self.gas = gas
+        self.progress = progress
+        self.rpc = BatchRpc(fsn.web3)
+
+
+    def pending(self):
+        #
+        # The tranches that have not been sent, with their journal entry if they were signed in an earlier run
+        #
+        done = readJournal(self.journal)
+        return [(tranche, done.get(tranche.index)) for tranche in self.schedule.tranches()
+                if 'txHash' not in done.get(tranche.index, {})]
+
+
+    def transaction(self, tranche, nonce):
+        tx = {
+            'from':     self.account.address,
+            'to':       tranche.to,
+            'nonce':    nonce,
+            'asset':    self.schedule.asset,
+            'value':    tranche.value,
+            'start':    hex(tranche.startTime),
+            'end':      hex(tranche.endTime),
+        }
+        if self.gasPrice is not None:
+            tx['gasPrice'] = self.gasPrice
+        if self.gas is not None:
+            tx['gas'] = self.gas
+        return buildSendToTimeLockTx(tx, self.chainId)
+
+
+    def _build(self, tranches, nonce):
+        built = self.rpc.call([
+            ('fsntx_buildSendTimeLockTx', [self.transaction(tranche, nonce + ii)]) for ii, tranche in enumerate(tranches)
+        ])
+        txs = []
+        for Tx in built:
+            Tx_dict = dict(Tx)
+            Tx_dict['chainId'] = self.chainId
+            txs.append(Tx_dict)
+        return txs
+
+
+    def run(self):
+        #
+        # Returns the list of (tranche, txHash) sent in this run
+        #
+        if self.schedule.sender is not None and self.schedule.sender.lower() != self.account.address.lower():
+            raise ValueError('Error in VestingDistributor: the schedule is for sender ', self.schedule.sender)
+        pending = self.pending()
+        total = len(self.schedule)
+        done = total - len(pending)
+        sent = []
+        if not pending:
+            return sent
+        recorded = sorted(((tranche, entry) for tranche, entry in pending if entry is not None),
+                          key=lambda item: item[1]['nonce'])
+        tranches = [tranche for tranche, entry in pending if entry is None]
+
+        journal = open(self.journal, 'a') if self.journal is not None else None
+        executor = None
+        try:
+            #
+            # First the tranches signed by an earlier run, again with the same nonce and transaction
+            #
+            for tranche, entry in recorded:
+                done = self._submit(journal, sent, done, total, tranche, entry['nonce'], entry['rawTx'], True)
+            if not tranches:
+                return sent
+
+            nonce = to_integer(self.fsn.web3.manager.request_blocking(
+                'eth_getTransactionCount', [self.account.address, 'pending']
+            ))
+            if recorded:
+                nonce = max(nonce, recorded[-1][1]['nonce'] + 1)
+            if self.workers > 1:
+                executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_initSigner,
+                                               initargs=(bytes(self.account.key),))
+            signing = None
+            for b in range(0, len(tranches), self.batch_size):
+                #
+                # Build this batch and start signing it while the previous one is being sent
+                #
+                batch = tranches[b:b + self.batch_size]
+                txs = self._build(batch, nonce + b)
+                if executor is not None:
+                    signed = executor.map(_sign, txs, chunksize=max(1, len(txs)//self.workers))
+                else:
+                    signed = (SignTx(Tx_dict, self.account) for Tx_dict in txs)
+                if signing is not None:
+                    done = self._send(signing, journal, sent, done, total)
+                signing = (batch, nonce + b, signed)
+            self._send(signing, journal, sent, done, total)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if journal is not None:
+                journal.close()
+        return sent
+
+
+    def _send(self, signing, journal, sent, done, total):
+        batch, firstNonce, signed = signing
+        for ii, (tranche, Tx_signed) in enumerate(zip(batch, signed)):
+            done = self._submit(journal, sent, done, total, tranche, firstNonce + ii, _jsonable(Tx_signed))
+        return done
+
+
+    def _write(self, journal, entry):
+        #
+        # Synced to disk, as the journal is what stops a tranche from being paid twice
+        #
+        journal.write(json.dumps(entry) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+    def _submit(self, journal, sent, done, total, tranche, nonce, Tx_signed, resend=False):
+        entry = {'index': tranche.index, 'to': tranche.to, 'value': str(tranche.value),
+                 'startTime': tranche.startTime, 'nonce': nonce}
+        if journal is not None and not resend:
+            self._write(journal, dict(entry, rawTx=Tx_signed))
+        try:
+            TxHash = self.fsn.web3.manager.request_blocking('fsntx_sendRawTransaction', [Tx_signed])
+        except ValueError:
+            #
+            # The node refuses a resend it already has, or has mined. Either way the nonce is used, and
+            # only this transaction was signed with it
+            #
+            if not resend or to_integer(self.fsn.web3.manager.request_blocking(
+                    'eth_getTransactionCount', [self.account.address, 'pending'])) <= nonce:
+                raise
+            TxHash = None
+        if isinstance(TxHash, (bytes, bytearray)):
+            TxHash = '0x' + bytes(TxHash).hex()
+        if journal is not None:
+            self._write(journal, dict(entry, txHash=TxHash))
+        sent.append((tranche, TxHash))
+        done += 1
+        if self.progress is not None:
+            self.progress(done, total, tranche, TxHash)
+        return done